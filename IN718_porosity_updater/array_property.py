@@ -0,0 +1,112 @@
+"""
+Numeric-array-backed pif properties.
+
+Per-pore data (centers of mass, volumes, diameters, ...) has one value per
+pore. Stored as a list of :class:`pypif.obj.Scalar` that costs a Python
+object per value; :class:`ArrayProperty` keeps the values in a NumPy buffer
+instead and only builds ``Scalar`` objects when ``scalars`` is read.
+Serialization through :mod:`pypif.pif` is unchanged.
+"""
+import re
+
+import numpy as np
+from pypif.obj import Property, Scalar
+
+_VALUES = re.compile(r'"value"\s*:\s*([^\s,}]+)')
+_NON_INTEGER = re.compile(r'"value"\s*:\s*[^\s,}]*[.eEIN]')
+
+
+class ArrayProperty(Property):
+    """
+    :class:`pypif.obj.Property` whose scalars may be held in a NumPy array.
+
+    Assigning a NumPy array (or anything with ``__array__``, such as a
+    pandas Series) to ``scalars`` stores it as a 1D array, and a
+    :class:`DeferredArray` is kept as is until the values are used; any
+    other value is handled exactly as by ``Property``.
+    """
+
+    @property
+    def scalars(self):
+        self._decode_deferred()
+        if isinstance(self._scalars, np.ndarray):
+            return [Scalar(value=x) for x in self._scalars.tolist()]
+        return self._scalars
+
+    @scalars.setter
+    def scalars(self, scalars):
+        if isinstance(scalars, DeferredArray):
+            self._scalars = scalars
+        elif hasattr(scalars, '__array__') and not isinstance(scalars, (list, Scalar)):
+            self._scalars = np.asarray(scalars).ravel()
+        else:
+            Property.scalars.fset(self, scalars)
+
+    @scalars.deleter
+    def scalars(self):
+        self._scalars = None
+
+    @property
+    def array(self):
+        """The scalar values as a NumPy array (no copy if array-backed)."""
+        return scalar_values(self)
+
+    def _decode_deferred(self):
+        if isinstance(self._scalars, DeferredArray):
+            self._scalars = self._scalars.decode()
+
+    def as_dictionary(self):
+        self._decode_deferred()
+        result = super(ArrayProperty, self).as_dictionary()
+        if isinstance(self._scalars, np.ndarray):
+            result['scalars'] = [{'value': x} for x in self._scalars.tolist()]
+        return result
+
+
+def scalar_values(prop, dtype=float):
+    """
+    Values of a property's scalars as a NumPy array.
+
+    :param prop: :class:`ArrayProperty` or :class:`pypif.obj.Property`.
+    :param dtype: dtype of the result.
+    :return: The backing array of an array-backed property, otherwise a new
+        array built from the scalar values.
+    :rtype: numpy.ndarray
+    """
+    if isinstance(prop, ArrayProperty):
+        prop._decode_deferred()
+    scalars = prop._scalars
+    if isinstance(scalars, np.ndarray):
+        return scalars.astype(dtype, copy=False)
+    if scalars is None:
+        return np.empty(0, dtype=dtype)
+    if not isinstance(scalars, list):
+        scalars = [scalars]
+    return np.array([s.value if isinstance(s, Scalar) else s for s in scalars], dtype=dtype)
+
+
+class DeferredArray(object):
+    """
+    JSON text of a list of numeric scalars, ``[{"value": x0}, ...]``, left
+    undecoded until it is needed.
+
+    :param text: The JSON list.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+    def __len__(self):
+        return self.text.count('{')
+
+    def decode(self):
+        """
+        Parses the values.
+
+        :return: int64 array if every value is an integer, otherwise float64.
+        :rtype: numpy.ndarray
+        """
+        values = np.array(_VALUES.findall(self.text))
+        if _NON_INTEGER.search(self.text):
+            return values.astype(np.float64)
+        return values.astype(np.int64)
@@ -0,0 +1,265 @@
+"""
+Memory-mapped binary cache of a directory of pif files.
+
+Parsing large pif files is dominated by the per-pore arrays. The cache
+splits every pif file of a directory into
+
+* ``<stem>.meta.json``: the systems with everything but their numeric
+  scalar arrays (ids, preparation, scalar properties, ...), and
+* ``<stem>/<n>.npy``: one array per property name (and dtype), holding
+  that property's values of all systems of the file back to back.
+
+Opening a cached file only decodes the metadata; each array property is
+an :class:`~IN718_porosity_updater.array_property.ArrayProperty` whose
+values are a zero-copy slice of a memory-mapped ``.npy``. The cache
+converts back to pif files byte-for-byte equal to re-serializing the
+original files.
+
+The metadata records the size and modification time (in ns) of the pif
+file it was built from, and a file is cached again whenever they differ.
+"""
+import json
+import os
+
+import numpy as np
+from pypif.pif import _dict_to_pio
+from pypif.util.case import keys_to_snake_case
+
+from IN718_porosity_updater import pif_io
+from IN718_porosity_updater.array_property import ArrayProperty
+
+
+CACHE_VERSION = 2
+
+
+class DatasetCache(object):
+    """
+    Binary cache of the pif files of a directory.
+
+    :param cache_dir: Directory holding the cache.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._arrays = {}
+
+    @classmethod
+    def build(cls, pif_dir, cache_dir):
+        """
+        Caches every pif file (``*.json``) of a directory. Files cached at
+        their current size and modification time are not read again.
+
+        :param pif_dir: Directory of pif files.
+        :param cache_dir: Directory to write the cache to.
+        :return: DatasetCache
+        """
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        cache = cls(cache_dir)
+        for f in sorted(os.listdir(pif_dir)):
+            if ".json" in f:
+                pif_path = os.path.join(pif_dir, f)
+                if not cache.is_current(pif_path):
+                    cache.add(pif_path)
+        return cache
+
+    def is_current(self, pif_path):
+        """
+        Whether a pif file is cached as it is now.
+
+        :param pif_path: Path to the pif file.
+        :return: bool
+        """
+        meta_path = self.meta_path(os.path.basename(pif_path))
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path, 'r') as fh:
+            meta = json.load(fh)
+        stat = os.stat(pif_path)
+        return meta.get('version') == CACHE_VERSION and meta.get('stamp') == [stat.st_size, stat.st_mtime_ns]
+
+    def meta_path(self, f):
+        """
+        Path of the metadata of a cached file.
+
+        :param f: Name of the pif file.
+        :return: Path.
+        """
+        return os.path.join(self.cache_dir, os.path.splitext(f)[0] + '.meta.json')
+
+    def array_dir(self, f):
+        """
+        Directory of the arrays of a cached file.
+
+        :param f: Name of the pif file.
+        :return: Path.
+        """
+        return os.path.join(self.cache_dir, os.path.splitext(f)[0])
+
+    def files(self):
+        """
+        Names of the cached pif files.
+
+        :return: Sorted list of file names.
+        """
+        suffix = '.meta.json'
+        return sorted(n[:-len(suffix)] + '.json' for n in os.listdir(self.cache_dir) if n.endswith(suffix))
+
+    def add(self, pif_path):
+        """
+        Caches a single pif file.
+
+        :param pif_path: Path to the pif file.
+        """
+        f = os.path.basename(pif_path)
+        # taken before reading, so a file changed meanwhile is cached again
+        stat = os.stat(pif_path)
+        keys = {}
+        chunks = []
+        sizes = []
+        systems = []
+        with open(pif_path, 'r') as fh:
+            # a file may hold a single pif rather than an array of them
+            single = fh.read(4096).lstrip()[:1] == '{'
+            fh.seek(0)
+            for system in pif_io.iterload(fh, large_arrays='defer', threshold=0):
+                refs = []
+                for prop in _all_properties(system):
+                    if isinstance(prop, ArrayProperty):
+                        prop._decode_deferred()
+                        values = prop._scalars
+                        key = (prop.name, values.dtype.str)
+                        if key not in keys:
+                            keys[key] = len(keys)
+                            chunks.append([])
+                            sizes.append(0)
+                        n = keys[key]
+                        chunks[n].append(values)
+                        refs.append({'array': n, 'start': sizes[n], 'stop': sizes[n] + len(values)})
+                        sizes[n] += len(values)
+                        prop.scalars = None
+                    else:
+                        refs.append(None)
+                meta = json.loads(pif_io.dumps(system))
+                for prop, ref in zip(_all_property_dicts(meta), refs):
+                    if ref is not None:
+                        prop['scalars'] = ref
+                systems.append(meta)
+
+        array_dir = self.array_dir(f)
+        if not os.path.exists(array_dir):
+            os.makedirs(array_dir)
+        for n, chunk in enumerate(chunks):
+            _atomic_save(os.path.join(array_dir, '{}.npy'.format(n)), np.concatenate(chunk))
+        meta = {'version': CACHE_VERSION, 'source': f, 'stamp': [stat.st_size, stat.st_mtime_ns],
+                'single': single,
+                'arrays': [{'name': name, 'dtype': dtype} for name, dtype in sorted(keys, key=keys.get)],
+                'systems': systems}
+        tmp = self.meta_path(f) + '.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(meta, fh)
+        os.replace(tmp, self.meta_path(f))
+        self._arrays.pop(f, None)
+
+    def metadata(self, f):
+        """
+        Metadata of a cached file.
+
+        :param f: Name of the pif file.
+        :return: dict with the source file name, whether it held a single
+            pif, the name and dtype of each array and the system
+            dictionaries.
+        """
+        with open(self.meta_path(f), 'r') as fh:
+            meta = json.load(fh)
+        if meta.get('version') != CACHE_VERSION:
+            raise ValueError('{} was written by another cache version'.format(self.meta_path(f)))
+        return meta
+
+    def arrays(self, f, meta=None):
+        """
+        Memory-mapped arrays of a cached file, one per property name (and
+        dtype), with the values of all systems back to back.
+
+        :param f: Name of the pif file.
+        :param meta: Metadata of the file, if already read.
+        :return: list of read-only numpy.memmap
+        """
+        if f not in self._arrays:
+            if meta is None:
+                meta = self.metadata(f)
+            self._arrays[f] = [np.load(os.path.join(self.array_dir(f), '{}.npy'.format(n)), mmap_mode='r')
+                               for n in range(len(meta['arrays']))]
+        return self._arrays[f]
+
+    def load(self, f, properties=None, meta=None):
+        """
+        Systems of a cached file.
+
+        :param f: Name of the pif file.
+        :param properties: Names of the properties to keep (all if None).
+        :param meta: Metadata of the file, if already read.
+        :return: list of pif systems; array properties are views of the
+            memory-mapped arrays.
+        """
+        if meta is None:
+            meta = self.metadata(f)
+        arrays = self.arrays(f, meta)
+        if properties is not None:
+            properties = frozenset(properties)
+        systems = []
+        for system in meta['systems']:
+            _restore(system, arrays, properties)
+            systems.append(_dict_to_pio(system))
+        return systems
+
+    def to_pif(self, out_dir):
+        """
+        Writes every cached file back out as a pif file.
+
+        :param out_dir: Directory to write the pif files to.
+        """
+        for f in self.files():
+            meta = self.metadata(f)
+            systems = self.load(f, meta=meta)
+            with open(os.path.join(out_dir, f), 'w') as fh:
+                pif_io.dump(systems[0] if meta['single'] else systems, fh)
+
+
+def _all_properties(system):
+    for prop in system.properties or ():
+        yield prop
+    for sub_system in system.sub_systems or ():
+        for prop in _all_properties(sub_system):
+            yield prop
+
+
+def _all_property_dicts(system):
+    for prop in system.get('properties') or ():
+        yield prop
+    for sub_system in system.get('subSystems') or ():
+        for prop in _all_property_dicts(sub_system):
+            yield prop
+
+
+def _restore(system, arrays, properties):
+    if system.get('properties') is not None:
+        restored = []
+        for prop in system['properties']:
+            if properties is not None and prop.get('name') not in properties:
+                continue
+            ref = prop.get('scalars')
+            if isinstance(ref, dict) and 'array' in ref:
+                prop['scalars'] = arrays[ref['array']][ref['start']:ref['stop']]
+                prop = ArrayProperty(**keys_to_snake_case(prop))
+            restored.append(prop)
+        system['properties'] = restored
+    for sub_system in system.get('subSystems') or ():
+        _restore(sub_system, arrays, properties)
+
+
+def _atomic_save(path, values):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fh:
+        np.save(fh, values)
+    os.replace(tmp, path)
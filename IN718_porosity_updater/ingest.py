@@ -0,0 +1,152 @@
+"""
+Column-projected ingest of tracr pore csv exports.
+
+Only the columns the pipeline uses are parsed, as float64, with the fastest
+csv engine available. The parsed columns are written next to the csv as a
+binary sidecar (a structured ``.npy`` array), which later runs memory-map
+instead of decoding the UTF-16 text again.
+
+The size and modification time (in ns) of the csv the sidecar was parsed
+from are appended to the ``.npy`` as a fixed-size trailer, which numpy
+ignores. A sidecar is only used while they match the csv exactly, so
+copying, restoring or rewriting a csv invalidates it whatever its
+timestamps.
+"""
+import os
+import struct
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+
+VOLUME = 'Volume (µm³)'
+CENTER_OF_MASS = ['Center Of Mass {} (µm)'.format(axis) for axis in 'XYZ']
+MIN_LOCATION = ['Min Location {} (µm)'.format(axis) for axis in 'XYZ']
+MAX_LOCATION = ['Max Location {} (µm)'.format(axis) for axis in 'XYZ']
+
+# Columns of a tracr export that the pipeline uses; these are cached
+# whenever a file is parsed, whichever subset was asked for.
+PORE_COLUMNS = [VOLUME] + CENTER_OF_MASS
+
+# Trailer of a sidecar: magic, then st_size and st_mtime_ns of the csv
+_STAMP = struct.Struct('<8sqq')
+_STAMP_MAGIC = b'PORECSV1'
+
+
+def sidecar_path(csv_path):
+    """
+    Path of the binary sidecar cache of a csv file.
+
+    :param csv_path: Path to the csv file.
+    :return: The csv path with its extension replaced by ``.npy``.
+    """
+    return os.path.splitext(csv_path)[0] + '.npy'
+
+
+def read_pore_csv(csv_path, columns=PORE_COLUMNS, use_cache=True):
+    """
+    Reads the requested columns of a tracr pore csv.
+
+    If an up-to-date sidecar holding the columns exists it is memory-mapped,
+    otherwise the csv is parsed and, if use_cache is set, the sidecar is
+    (re)written.
+
+    :param csv_path: Path to the csv file.
+    :param columns: Names of the columns to read.
+    :param use_cache: Whether to read and write the sidecar.
+    :return: Dictionary mapping each column name to a float64 array.
+    :rtype: dict
+    """
+    if use_cache:
+        cached = load_sidecar(csv_path, columns)
+        if cached is not None:
+            return cached
+    # taken before parsing, so a csv changed meanwhile invalidates the sidecar
+    stat = os.stat(csv_path)
+    header = pd.read_csv(csv_path, encoding='utf-16', nrows=0).columns
+    missing = [c for c in columns if c not in header]
+    if missing:
+        raise KeyError("{} has no column(s) {}".format(csv_path, ', '.join(missing)))
+    usecols = [c for c in header if c in columns or c in PORE_COLUMNS]
+    df = pd.read_csv(csv_path, encoding='utf-16', usecols=usecols,
+                     dtype={c: np.float64 for c in usecols}, engine=CSV_ENGINE)
+    records = np.empty(len(df), dtype=[(c, np.float64) for c in usecols])
+    for c in usecols:
+        records[c] = df[c].values
+    if use_cache:
+        write_sidecar(csv_path, records, stamp=[stat.st_size, stat.st_mtime_ns])
+    return {c: records[c] for c in columns}
+
+
+def sample_bounds(csv_path, use_cache=True):
+    """
+    Bounding box of the pores of a tracr pore csv, from the Min and Max
+    Location columns.
+
+    :param csv_path: Path to the csv file.
+    :param use_cache: Whether to read and write the sidecar.
+    :return: ``((xmin, ymin, zmin), (xmax, ymax, zmax))``, as taken by the
+        ``bounds`` of :class:`PoreStatistics`.
+    :rtype: tuple
+    """
+    data = read_pore_csv(csv_path, columns=MIN_LOCATION + MAX_LOCATION, use_cache=use_cache)
+    return (tuple(float(data[c].min()) for c in MIN_LOCATION),
+            tuple(float(data[c].max()) for c in MAX_LOCATION))
+
+
+def load_sidecar(csv_path, columns=PORE_COLUMNS):
+    """
+    Memory-maps the sidecar of a csv file.
+
+    :param csv_path: Path to the csv file.
+    :param columns: Names of the columns that must be present.
+    :return: Dictionary mapping each column name to a read-only array, or
+        None if the sidecar is missing, was parsed from another version of
+        the csv or lacks a column.
+    """
+    sidecar = sidecar_path(csv_path)
+    if not os.path.exists(sidecar):
+        return None
+    stat = os.stat(csv_path)
+    if _read_stamp(sidecar) != [stat.st_size, stat.st_mtime_ns]:
+        return None
+    records = np.load(sidecar, mmap_mode='r')
+    if records.dtype.names is None or not set(columns) <= set(records.dtype.names):
+        return None
+    return {c: records[c] for c in columns}
+
+
+def write_sidecar(csv_path, records, stamp=None):
+    """
+    Atomically writes the structured array of parsed columns next to the csv.
+
+    :param csv_path: Path to the csv file.
+    :param records: Structured array, one field per column.
+    :param stamp: ``[st_size, st_mtime_ns]`` of the csv the records were
+        parsed from (the csv as it is now by default).
+    """
+    if stamp is None:
+        stat = os.stat(csv_path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+    sidecar = sidecar_path(csv_path)
+    tmp = sidecar + '.tmp'
+    with open(tmp, 'wb') as fh:
+        np.save(fh, records)
+        fh.write(_STAMP.pack(_STAMP_MAGIC, *stamp))
+    os.replace(tmp, sidecar)
+
+
+def _read_stamp(sidecar):
+    # [st_size, st_mtime_ns] of the csv, or None for sidecars without one
+    with open(sidecar, 'rb') as fh:
+        fh.seek(0, os.SEEK_END)
+        if fh.tell() < _STAMP.size:
+            return None
+        fh.seek(-_STAMP.size, os.SEEK_END)
+        magic, size, mtime_ns = _STAMP.unpack(fh.read(_STAMP.size))
+    return [size, mtime_ns] if magic == _STAMP_MAGIC else None
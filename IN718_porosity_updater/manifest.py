@@ -0,0 +1,107 @@
+"""
+Content-hash manifest for incremental rebuilds.
+
+A manifest lives in an output directory and records, for every output
+file, the content hash of each input it was built from together with the
+parameters (pipeline version, statistics version, options) used to build
+it. An output is up to date when it exists and its recorded fingerprint
+matches the current one, so only outputs whose inputs or parameters
+changed are rebuilt. Because fingerprints use content hashes, a rebuilt
+intermediate that comes out byte-identical does not trigger its
+dependents.
+"""
+import hashlib
+import json
+import os
+
+
+MANIFEST_NAME = '.manifest'
+
+
+class Manifest(object):
+    """
+    Build manifest of a single output directory.
+
+    :param directory: Output directory; the manifest is stored in it as
+        ``MANIFEST_NAME``.
+    """
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        self.outputs = {}
+        self.hashes = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as fh:
+                saved = json.load(fh)
+            self.outputs = saved.get('outputs', {})
+            self.hashes = saved.get('hashes', {})
+
+    def file_hash(self, path):
+        """
+        SHA-256 of a file's contents. Hashes are remembered by path, size
+        and modification time, so unchanged files are not read again.
+
+        :param path: Path to the file.
+        :return: Hex digest.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = [stat.st_size, stat.st_mtime_ns]
+        cached = self.hashes.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as fh:
+            for block in iter(lambda: fh.read(1 << 20), b''):
+                digest.update(block)
+        self.hashes[path] = [key, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def fingerprint(self, inputs, **params):
+        """
+        Fingerprint of an output built from the given inputs and parameters.
+
+        :param inputs: Paths of the input files.
+        :param params: JSON-serializable build parameters.
+        :return: dict
+        """
+        return {'inputs': {os.path.abspath(p): self.file_hash(p) for p in inputs},
+                'params': json.loads(json.dumps(params, sort_keys=True, default=str))}
+
+    def is_current(self, output, inputs, **params):
+        """
+        Whether output exists and was built from these inputs and parameters.
+
+        :param output: Path of the output file.
+        :param inputs: Paths of the input files.
+        :param params: Build parameters.
+        :return: bool
+        """
+        recorded = self.outputs.get(os.path.basename(output))
+        return (recorded is not None and os.path.exists(output) and
+                recorded == self.fingerprint(inputs, **params))
+
+    def recorded_params(self, output):
+        """
+        Parameters output was last recorded with.
+
+        :param output: Path of the output file.
+        :return: dict, empty if output was never recorded.
+        """
+        recorded = self.outputs.get(os.path.basename(output))
+        return {} if recorded is None else recorded['params']
+
+    def record(self, output, inputs, **params):
+        """
+        Records that output was built from these inputs and parameters.
+        """
+        self.outputs[os.path.basename(output)] = self.fingerprint(inputs, **params)
+
+    def save(self):
+        """
+        Atomically writes the manifest.
+        """
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump({'outputs': self.outputs, 'hashes': self.hashes}, fh, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
@@ -0,0 +1,360 @@
+"""
+Per-stage metrics of pipeline runs.
+
+The pipeline functions wrap each unit of work (a stage applied to a file,
+a pipeline stage applied to a batch, a transfer) in :func:`stage`::
+
+    with metrics.stage('refine', file=f) as record:
+        record.read(infile_path)
+        ...
+        record.add(systems=writer.count)
+        record.wrote(outfile_path)
+
+and code deeper down adds to whichever stage is running with
+:func:`count` (e.g. ``metrics.count(pores=n)``).
+
+Nothing is measured until :func:`enable` is called: until then
+:func:`stage` returns a shared do-nothing record, so instrumented code
+costs a function call per file or batch. Once enabled, every stage
+records its wall time, the CPU time of the thread running it, the bytes
+of the files it read and wrote, the pores and systems it processed and
+the peak resident set size of the process so far. Records are written
+as JSON lines and summed up per stage in a table, and the whole run can
+be profiled with cProfile.
+"""
+import cProfile
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+COUNTERS = ('bytes_read', 'bytes_written', 'pores', 'systems')
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process.
+
+    :return: MiB
+    """
+    # on Linux getrusage also counts the peak of the parent before exec,
+    # /proc only the current process image
+    try:
+        with open('/proc/self/status', 'r') as fh:
+            for line in fh:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / (1 << 10)
+    except (IOError, OSError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+
+class _NullRecord(object):
+    # what stage() returns while metrics are disabled
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def read(self, path):
+        pass
+
+    def wrote(self, path):
+        pass
+
+    def add(self, **counts):
+        pass
+
+
+class StageRecord(object):
+    """
+    Measurements of one stage; see :meth:`Recorder.stage`.
+    """
+
+    def __init__(self, recorder, name, file=None):
+        self.recorder = recorder
+        self.name = name
+        self.file = file
+        self.counts = OrderedDict((counter, 0) for counter in COUNTERS)
+
+    def __enter__(self):
+        self.recorder._stack().append(self)
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self._wall
+        cpu = time.thread_time() - self._cpu
+        self.recorder._stack().pop()
+        record = OrderedDict([('event', 'stage'), ('stage', self.name), ('file', self.file),
+                              ('wall_s', round(wall, 6)), ('cpu_s', round(cpu, 6))])
+        record.update(self.counts)
+        record['peak_rss_mb'] = round(peak_rss_mb(), 1)
+        record['pid'] = os.getpid()
+        if exc_type is not None:
+            record['error'] = repr(exc_value)
+        self.recorder.emit(record)
+        return False
+
+    def read(self, path):
+        """
+        Counts the size of a file the stage read.
+
+        :param path: Path of the file.
+        """
+        self.counts['bytes_read'] += os.path.getsize(path)
+
+    def wrote(self, path):
+        """
+        Counts the size of a file the stage wrote.
+
+        :param path: Path of the file.
+        """
+        self.counts['bytes_written'] += os.path.getsize(path)
+
+    def add(self, **counts):
+        """
+        Adds to the counters of the stage.
+
+        :param counts: Counter names (see COUNTERS) and amounts.
+        """
+        for counter, amount in counts.items():
+            self.counts[counter] += amount
+
+
+class NullRecorder(object):
+    """
+    Recorder in use while metrics are disabled.
+    """
+    enabled = False
+    records = ()
+
+    def stage(self, name, file=None):
+        return _NULL_RECORD
+
+    def count(self, **counts):
+        pass
+
+    def emit(self, record):
+        pass
+
+    def close(self):
+        pass
+
+
+_NULL_RECORD = _NullRecord()
+
+
+class Recorder(object):
+    """
+    Collects the records of the stages run while it is enabled.
+
+    :param jsonl: File (path, or '-' for stdout) to write every record to
+        as a line of JSON, or None.
+    :param summary: Whether to print the per-stage summary on close.
+    :param profile: File to write the cProfile statistics of the run to,
+        or None.
+    """
+    enabled = True
+
+    def __init__(self, jsonl=None, summary=False, profile=None):
+        self.records = []
+        self.summary = summary
+        self.profile = profile
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._start = time.perf_counter()
+        self._out = None
+        if jsonl == '-':
+            self._out = sys.stdout
+        elif jsonl is not None:
+            self._out = open(jsonl, 'w')
+        self._profiler = None
+        if profile is not None:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def stage(self, name, file=None):
+        """
+        Context manager measuring a stage.
+
+        :param name: Stage name.
+        :param file: File the stage works on, if any.
+        :return: StageRecord
+        """
+        return StageRecord(self, name, file)
+
+    def count(self, **counts):
+        """
+        Adds to the counters of the innermost stage running in this thread
+        (nothing if no stage is running).
+
+        :param counts: Counter names (see COUNTERS) and amounts.
+        """
+        stack = self._stack()
+        if stack:
+            stack[-1].add(**counts)
+
+    def emit(self, record):
+        """
+        Writes and keeps a record.
+
+        :param record: dict
+        """
+        with self._lock:
+            self.records.append(record)
+            if self._out is not None:
+                self._out.write(json.dumps(record) + '\n')
+                self._out.flush()
+
+    def summarize(self):
+        """
+        Sums the records up per stage.
+
+        :return: list of dicts with the stage name, the number of records and
+            files, the summed wall and CPU time and counters and the highest
+            peak RSS, in the order the stages first finished.
+        """
+        rows = OrderedDict()
+        for record in self.records:
+            if record.get('event') != 'stage':
+                continue
+            row = rows.get(record['stage'])
+            if row is None:
+                row = rows[record['stage']] = OrderedDict([('stage', record['stage']), ('calls', 0), ('files', set()),
+                                                           ('wall_s', 0.0), ('cpu_s', 0.0)])
+                row.update((counter, 0) for counter in COUNTERS)
+                row['peak_rss_mb'] = 0.0
+            row['calls'] += 1
+            if record.get('file') is not None:
+                row['files'].add(record['file'])
+            for key in ('wall_s', 'cpu_s') + COUNTERS:
+                row[key] += record.get(key, 0)
+            row['peak_rss_mb'] = max(row['peak_rss_mb'], record.get('peak_rss_mb', 0.0))
+        for row in rows.values():
+            row['files'] = len(row['files'])
+        return list(rows.values())
+
+    def report(self, file=None):
+        """
+        Prints the per-stage summary. Nested stages (e.g. the pipeline stages
+        within a file) are also counted in the stage they ran in.
+
+        :param file: Stream to print to (stdout by default).
+        """
+        file = file or sys.stdout
+        print("METRICS: {:<24} {:>6} {:>6} {:>10} {:>10} {:>10} {:>10} {:>8} {:>11} {:>11} {:>9}".format(
+            'stage', 'calls', 'files', 'wall s', 'cpu s', 'MB read', 'MB written', 'systems', 'pores', 'pores/s',
+            'peak MiB'), file=file)
+        for row in self.summarize():
+            rate = row['pores'] / row['wall_s'] if row['wall_s'] else 0.0
+            print("METRICS: {:<24} {:>6} {:>6} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f} {:>8} {:>11} {:>11.4g} {:>9.1f}".format(
+                row['stage'], row['calls'], row['files'], row['wall_s'], row['cpu_s'], row['bytes_read'] / 1e6,
+                row['bytes_written'] / 1e6, row['systems'], row['pores'], rate, row['peak_rss_mb']), file=file)
+
+    def close(self):
+        """
+        Stops the profiler and writes its statistics, writes a final record
+        with the totals of the run and prints the summary if asked to.
+        """
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile)
+            self._profiler = None
+        self.emit(OrderedDict([('event', 'end'), ('wall_s', round(time.perf_counter() - self._start, 6)),
+                               ('cpu_s', round(time.process_time(), 6)), ('peak_rss_mb', round(peak_rss_mb(), 1)),
+                               ('pid', os.getpid())]))
+        if self.summary:
+            self.report()
+        if self._out is not None and self._out is not sys.stdout:
+            self._out.close()
+        self._out = None
+
+
+_recorder = NullRecorder()
+
+
+def current():
+    """
+    The recorder in use.
+
+    :return: Recorder, or a NullRecorder while metrics are disabled.
+    """
+    return _recorder
+
+
+def stage(name, file=None):
+    """
+    Context manager measuring a stage with the recorder in use; see
+    :meth:`Recorder.stage`.
+    """
+    return _recorder.stage(name, file)
+
+
+def count(**counts):
+    """
+    Adds to the counters of the running stage; see :meth:`Recorder.count`.
+    """
+    _recorder.count(**counts)
+
+
+def enable(jsonl=None, summary=True, profile=None):
+    """
+    Starts recording metrics; see :class:`Recorder` for the options.
+
+    :return: The Recorder.
+    """
+    global _recorder
+    _recorder.close()
+    _recorder = Recorder(jsonl=jsonl, summary=summary, profile=profile)
+    return _recorder
+
+
+def disable():
+    """
+    Stops recording metrics, closing the recorder (which writes the
+    profile and prints the summary, if asked to).
+    """
+    global _recorder
+    recorder, _recorder = _recorder, NullRecorder()
+    recorder.close()
+
+
+def run_recorded(func, *args, **kwargs):
+    """
+    Calls func with metrics recorded in memory, e.g. in a worker process,
+    whose records the parent then passes to :func:`emit_all`.
+
+    :return: Tuple of what func returns and the list of records.
+    """
+    global _recorder
+    previous, _recorder = _recorder, Recorder()
+    try:
+        return func(*args, **kwargs), _recorder.records
+    finally:
+        _recorder = previous
+
+
+def emit_all(records):
+    """
+    Passes records (e.g. from :func:`run_recorded`) to the recorder in use.
+
+    :param records: List of records.
+    """
+    for record in records:
+        _recorder.emit(record)
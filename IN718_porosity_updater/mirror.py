@@ -0,0 +1,202 @@
+"""
+Content-addressed local mirror of remote datasets.
+
+Every downloaded file is stored once, by the SHA-256 of its contents,
+under ``<root>/objects`` and made read-only; ``<root>/datasets/<id>.json``
+records which object each path of a dataset currently is. Syncing a
+dataset only downloads files whose remote checksum differs from the one
+recorded at the last sync (files listed without a checksum are
+re-downloaded, but still stored only once). Checking a dataset out
+hard-links the objects into a directory, so the pipeline gets read-only
+views of the mirror rather than fresh copies, and works without network
+access once the dataset has been synced.
+"""
+import json
+import os
+import shutil
+import stat
+import tempfile
+
+from IN718_porosity_updater import metrics
+from IN718_porosity_updater.transfer import file_sha256, retry, run_transfers
+
+
+# Attributes of a listed dataset file that may hold a checksum of its contents
+CHECKSUM_ATTRIBUTES = ('sha256', 'checksum', 'md5', 'etag')
+
+
+def remote_checksum(dataset_file):
+    """
+    Checksum of a listed dataset file, as reported by the server.
+
+    :param dataset_file: Entry of ``get_dataset_files``.
+    :return: str, or None if the listing has no checksum.
+    """
+    for name in CHECKSUM_ATTRIBUTES:
+        value = getattr(dataset_file, name, None)
+        if value:
+            return '{}:{}'.format(name, value)
+    return None
+
+
+class DatasetMirror(object):
+    """
+    Local mirror of remote datasets.
+
+    :param root: Directory of the mirror.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        for sub_dir in ('objects', 'datasets', 'tmp'):
+            path = os.path.join(root, sub_dir)
+            if not os.path.exists(path):
+                os.makedirs(path)
+
+    def object_path(self, digest):
+        """
+        Path of the object with the given SHA-256.
+
+        :param digest: Hex digest.
+        :return: Path.
+        """
+        return os.path.join(self.root, 'objects', digest[:2], digest)
+
+    def snapshot_path(self, dataset_id):
+        return os.path.join(self.root, 'datasets', '{}.json'.format(dataset_id))
+
+    def snapshot(self, dataset_id):
+        """
+        Files of a dataset as of its last sync.
+
+        :param dataset_id: Dataset.
+        :return: dict mapping each path to its ``sha256`` and remote
+            ``checksum``.
+        """
+        path = self.snapshot_path(dataset_id)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r') as fh:
+            return json.load(fh)
+
+    def _save_snapshot(self, dataset_id, files):
+        path = self.snapshot_path(dataset_id)
+        with open(path + '.tmp', 'w') as fh:
+            json.dump(files, fh, indent=1, sort_keys=True)
+        os.replace(path + '.tmp', path)
+
+    def add(self, path):
+        """
+        Moves a file into the object store, unless an identical object is
+        already there.
+
+        :param path: Path of the file; it is consumed.
+        :return: SHA-256 of the file.
+        """
+        digest = file_sha256(path)
+        target = self.object_path(digest)
+        if os.path.exists(target):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(path, target)
+        return digest
+
+    def sync(self, data_client, dataset_id, jobs=4, attempts=5, backoff=1.0):
+        """
+        Brings the mirror of a dataset up to date with the server,
+        downloading only files whose checksum changed.
+
+        :param data_client: Data client (e.g. ``CitrinationClient(...).data``).
+        :param dataset_id: Dataset.
+        :param jobs: Maximum number of concurrent downloads.
+        :param attempts: Attempts per file (and for listing the dataset).
+        :param backoff: Initial retry wait, in seconds.
+        :return: List of (path, exception) of the files that failed; their
+            previous version, if any, stays in the snapshot.
+        """
+        old = self.snapshot(dataset_id)
+        listing = retry(lambda: data_client.get_dataset_files(dataset_id=dataset_id), attempts, backoff)
+        files = {}
+        transfers = {}
+        for dataset_file in listing:
+            checksum = remote_checksum(dataset_file)
+            entry = old.get(dataset_file.path)
+            if (checksum is not None and entry is not None and entry['checksum'] == checksum and
+                    os.path.exists(self.object_path(entry['sha256']))):
+                files[dataset_file.path] = entry
+            else:
+                transfers[dataset_file.path] = self._fetch(data_client, dataset_file, checksum, files,
+                                                           attempts, backoff)
+        print("Fetching {} of {} files of dataset {}...".format(len(transfers), len(listing), dataset_id))
+        failures = run_transfers(transfers, jobs)
+        for path, error in failures:
+            if path in old:
+                files[path] = old[path]
+        self._save_snapshot(dataset_id, files)
+        return failures
+
+    def _fetch(self, data_client, dataset_file, checksum, files, attempts, backoff):
+        def transfer():
+            staging = tempfile.mkdtemp(dir=os.path.join(self.root, 'tmp'))
+            try:
+                with metrics.stage('fetch', file=dataset_file.path) as record:
+                    retry(lambda: data_client.download_files([dataset_file], destination=staging), attempts, backoff)
+                    record.wrote(os.path.join(staging, dataset_file.path))
+                digest = self.add(os.path.join(staging, dataset_file.path))
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+            files[dataset_file.path] = {'sha256': digest, 'checksum': checksum}
+            print("FETCHED: ", dataset_file.path)
+        return transfer
+
+    def checkout(self, dataset_id, destination):
+        """
+        Places the files of a dataset's last sync in a directory as hard
+        links to the (read-only) objects, or as read-only copies where the
+        directory is on another file system. Works offline.
+
+        :param dataset_id: Dataset.
+        :param destination: Directory; files keep their dataset paths below
+            it.
+        :return: List of the paths written.
+        """
+        written = []
+        for path, entry in sorted(self.snapshot(dataset_id).items()):
+            target = os.path.join(destination, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            source = self.object_path(entry['sha256'])
+            if os.path.exists(target) and os.path.samefile(source, target):
+                continue
+            tmp = target + '.tmp'
+            if os.path.lexists(tmp):
+                os.remove(tmp)
+            try:
+                os.link(source, tmp)
+            except OSError:
+                shutil.copyfile(source, tmp)
+                os.chmod(tmp, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp, target)
+            written.append(target)
+        return written
+
+    def prune(self):
+        """
+        Deletes the objects that no dataset snapshot refers to.
+
+        :return: Number of objects deleted.
+        """
+        referenced = set()
+        for name in os.listdir(os.path.join(self.root, 'datasets')):
+            if name.endswith('.json'):
+                dataset_id = name[:-len('.json')]
+                referenced.update(entry['sha256'] for entry in self.snapshot(dataset_id).values())
+        deleted = 0
+        objects = os.path.join(self.root, 'objects')
+        for prefix in os.listdir(objects):
+            for digest in os.listdir(os.path.join(objects, prefix)):
+                if digest not in referenced:
+                    os.remove(os.path.join(objects, prefix, digest))
+                    deleted += 1
+        return deleted
@@ -0,0 +1,423 @@
+"""
+Streaming pif serialization.
+
+:func:`pypif.pif.dump` converts every object to a dictionary and encodes
+the whole document before writing it. The writer here walks the pif
+objects directly and writes each system as soon as it is encoded, and
+numeric arrays held by :class:`~IN718_porosity_updater.array_property.ArrayProperty`
+are encoded straight from their buffers (with orjson when it is
+installed). The output is byte-for-byte what ``pif.dump`` writes.
+
+:func:`iterload` is the reading counterpart: it parses a file holding a
+JSON array of pifs one element at a time, and can leave large numeric
+scalar arrays undecoded, so a filter over a dataset file only ever holds
+one system in memory.
+"""
+import contextlib
+import json
+import os
+import re
+
+import numpy as np
+from pypif.pif import _dict_to_pio
+from pypif.util.case import keys_to_snake_case, to_camel_case
+from pypif.util.serializable import Serializable
+
+from IN718_porosity_updater.array_property import ArrayProperty, DeferredArray
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dump(pif, fp):
+    """
+    Writes a single pif object, or a list of them, to a file-like object.
+
+    :param pif: Object or list of objects to serialize.
+    :param fp: File-like object supporting .write().
+    """
+    if isinstance(pif, (list, tuple)):
+        with PifWriter(fp) as writer:
+            for obj in pif:
+                writer.write(obj)
+    else:
+        for chunk in iterencode(pif):
+            fp.write(chunk)
+
+
+def dumps(pif):
+    """
+    Serializes a single pif object, or a list of them, to a string.
+
+    :param pif: Object or list of objects to serialize.
+    :return: str
+    """
+    if pif is None:
+        return '[]'
+    return ''.join(iterencode(pif))
+
+
+class PifWriter(object):
+    """
+    Writes a JSON array of pif objects one object at a time, so only the
+    object being encoded needs to be held in memory.
+
+    :param fp: File-like object supporting .write().
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.count = 0
+        self.fp.write('[')
+
+    def write(self, obj):
+        """
+        Encodes obj and appends it to the array.
+
+        :param obj: Pif object (e.g. a ChemicalSystem).
+        """
+        if self.count:
+            self.fp.write(', ')
+        for chunk in iterencode(obj):
+            self.fp.write(chunk)
+        self.count += 1
+
+    def close(self):
+        """
+        Terminates the array. Does not close the file.
+        """
+        self.fp.write(']')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # an array cut short by an error is left unterminated, so it can
+        # not be mistaken for a complete file
+        if exc_type is None:
+            self.close()
+
+
+@contextlib.contextmanager
+def open_output(path):
+    """
+    Opens a file for writing in place of path, which is replaced by it only
+    once the block completes; if the block raises, the file is removed and
+    path is left untouched.
+
+    The file is written next to path with a ``.tmp`` extension (rather
+    than appended to the name), so one left behind by a killed process is
+    not mistaken for a ``.json`` input.
+
+    :param path: Path of the output file.
+    :return: Context manager yielding the open file.
+    """
+    tmp = os.path.splitext(path)[0] + '.tmp'
+    try:
+        with open(tmp, 'w') as fh:
+            yield fh
+    except BaseException:
+        os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+
+
+def iterencode(obj):
+    """
+    Encodes a pif object (or any value it may contain) as JSON, yielding
+    the output in pieces.
+
+    :param obj: Object to encode.
+    :return: Iterator of str.
+    """
+    if hasattr(obj, 'as_dictionary'):
+        if isinstance(obj, ArrayProperty) or type(obj).as_dictionary is Serializable.as_dictionary:
+            items = ((to_camel_case(k), v) for k, v in obj.__dict__.items() if v is not None)
+            for chunk in _iterencode_items(items, arrays_as_scalars=isinstance(obj, ArrayProperty)):
+                yield chunk
+        else:
+            for chunk in iterencode(obj.as_dictionary()):
+                yield chunk
+    elif isinstance(obj, dict):
+        for chunk in _iterencode_items(obj.items()):
+            yield chunk
+    elif isinstance(obj, (list, tuple)):
+        yield '['
+        for i, item in enumerate(obj):
+            if i:
+                yield ', '
+            for chunk in iterencode(item):
+                yield chunk
+        yield ']'
+    elif isinstance(obj, np.ndarray):
+        yield json.dumps(obj.tolist())
+    elif isinstance(obj, np.integer):
+        yield json.dumps(int(obj))
+    elif isinstance(obj, np.floating):
+        yield json.dumps(float(obj))
+    elif obj is None:
+        yield 'null'
+    else:
+        yield json.dumps(obj)
+
+
+def _iterencode_items(items, arrays_as_scalars=False):
+    yield '{'
+    first = True
+    for key, value in items:
+        if not first:
+            yield ', '
+        first = False
+        yield json.dumps(key) + ': '
+        if arrays_as_scalars and isinstance(value, np.ndarray):
+            yield encode_scalar_array(value)
+        elif arrays_as_scalars and isinstance(value, DeferredArray):
+            yield encode_scalar_array(value.decode())
+        else:
+            for chunk in iterencode(value):
+                yield chunk
+    yield '}'
+
+
+def encode_scalar_array(values):
+    """
+    Encodes a numeric array as a JSON list of pif scalars,
+    ``[{"value": x0}, {"value": x1}, ...]``, without creating a Python
+    object per value.
+
+    :param values: 1D numeric array.
+    :return: str
+    """
+    values = np.asarray(values).ravel()
+    if values.size == 0:
+        return '[]'
+    if values.dtype.kind in 'iu':
+        if orjson is not None and (values.dtype.kind == 'i' or values.dtype.itemsize < 8):
+            text = orjson.dumps(values.astype(np.int64), option=orjson.OPT_SERIALIZE_NUMPY).decode()
+            items = text[1:-1].split(',')
+        else:
+            items = map(str, values.tolist())
+    elif values.dtype.kind == 'f':
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        if orjson is not None and np.isfinite(values).all():
+            items = orjson.dumps(values, option=orjson.OPT_SERIALIZE_NUMPY).decode()[1:-1].split(',')
+            # orjson and repr agree on 0 and 1e-4 <= |x| < 1e16, but not on
+            # when to switch to exponent notation outside that range
+            magnitude = np.abs(values)
+            for i in np.flatnonzero(((magnitude < 1e-4) & (magnitude > 0)) | (magnitude >= 1e16)):
+                items[i] = repr(float(values[i]))
+        else:
+            # json spells the non-finite values NaN/Infinity; orjson would write null
+            items = map(json.dumps, values.tolist())
+    else:
+        items = map(json.dumps, values.tolist())
+    return '[{"value": ' + '}, {"value": '.join(items) + '}]'
+
+
+# A "scalars" list whose entries are all {"value": <number>} is matched as a
+# single token, so large arrays are skipped over at C speed; a "scalars"
+# list cut off by the end of the buffer is matched as partial. Only numbers
+# (and NaN, Infinity) are matched, as null, true and false are not decoded
+# by DeferredArray.
+_VALUE = r'\{\s*"value"\s*:\s*(?:-?(?:[0-9][-+0-9.eE]*|Infinity)|NaN)\s*\}'
+_TOKEN = re.compile(
+    r'"scalars"\s*:\s*(?:(?P<array>\[\s*' + _VALUE + r'(?:\s*,\s*' + _VALUE + r')*\s*\])'
+    r'|(?P<partial>\[[^\]]*\Z))'
+    r'|"(?:[^"\\]|\\.)*(?P<closed>"?)'
+    r'|(?P<open>[\[{])|(?P<close>[\]}])')
+_WHITESPACE = re.compile(r'\s*')
+
+
+def iterload(fp, large_arrays='load', threshold=10000, properties=None, chunk_size=1 << 20):
+    """
+    Reads a JSON array of pifs from a file-like object, yielding the pif
+    objects one at a time. A file holding a single pif yields just that
+    one.
+
+    :param fp: File-like object supporting .read().
+    :param large_arrays: What to do with property scalars that are lists of
+        more than threshold numbers: 'load' them as usual, 'defer' decoding
+        (the property is returned as an
+        :class:`~IN718_porosity_updater.array_property.ArrayProperty` that
+        decodes its values into an array when they are first used) or
+        'skip' them (the property is returned without scalars).
+    :param threshold: Length above which a scalar array is large.
+    :param properties: Names of the properties to keep. If given, the
+        properties of a system (and of its sub-systems) that are not named
+        are dropped while parsing, and their numeric scalar arrays are
+        never decoded.
+    :param chunk_size: Number of characters read at a time.
+    :return: Iterator of pif objects (e.g. ChemicalSystem).
+    """
+    if large_arrays not in ('load', 'defer', 'skip'):
+        raise ValueError("large_arrays must be 'load', 'defer' or 'skip', not {!r}".format(large_arrays))
+    if properties is not None:
+        properties = frozenset(properties)
+    reader = _ChunkReader(fp, chunk_size)
+    char = reader.next_char()
+    if char == '{':
+        yield _read_pif(reader, large_arrays, threshold, properties)
+        return
+    if char != '[':
+        raise ValueError('expecting a pif or a JSON array of pifs')
+    reader.pos += 1
+    first = True
+    while True:
+        char = reader.next_char()
+        if char == ']':
+            return
+        if not first:
+            if char != ',':
+                raise ValueError("expecting ',' or ']' at offset {}".format(reader.offset()))
+            reader.pos += 1
+            reader.next_char()
+        first = False
+        yield _read_pif(reader, large_arrays, threshold, properties)
+
+
+def _read_pif(reader, large_arrays, threshold, properties):
+    if large_arrays == 'load' and properties is None:
+        return _dict_to_pio(reader.decode())
+    text, arrays = reader.element()
+    return _dict_to_pio(_decode_element(text, arrays, large_arrays, threshold, properties))
+
+
+_DEFERRED = '\x00deferred'
+
+
+def _decode_element(text, arrays, large_arrays, threshold, properties=None):
+    """
+    Decodes one array element. The numeric scalar arrays (given as
+    (start, end) offsets into text) of more than threshold values are
+    deferred or dropped; with a projection, properties not named in it
+    are dropped before any of their arrays are decoded.
+    """
+    # with a projection every array is set aside until its property is kept
+    cutoff = threshold if properties is None else 0
+    pieces = []
+    deferred = []
+    last = 0
+    for start, end in arrays:
+        array = text[start:end]
+        if array.count('{') <= cutoff:
+            continue
+        pieces.append(text[last:start])
+        if large_arrays == 'skip' and properties is None:
+            pieces.append('null')
+        else:
+            pieces.append('{"\\u0000deferred": %d}' % len(deferred))
+            deferred.append(DeferredArray(array))
+        last = end
+    pieces.append(text[last:])
+    if deferred:
+        obj = json.loads(''.join(pieces), object_hook=lambda d: deferred[d[_DEFERRED]] if _DEFERRED in d else d)
+    else:
+        obj = json.loads(''.join(pieces))
+    if properties is not None:
+        _project(obj, properties)
+    return _resolve(obj, large_arrays, threshold) if deferred else obj
+
+
+def _project(obj, properties):
+    """Drops the properties of a system dictionary, and of its sub-systems, not named in properties."""
+    if obj.get('properties') is not None:
+        obj['properties'] = [prop for prop in obj['properties'] if prop.get('name') in properties]
+    for sub_system in obj.get('subSystems') or ():
+        _project(sub_system, properties)
+
+
+def _resolve(obj, large_arrays, threshold):
+    """Replaces the deferred arrays left in a decoded dictionary according to large_arrays."""
+    if isinstance(obj, list):
+        return [_resolve(item, large_arrays, threshold) for item in obj]
+    if not isinstance(obj, dict):
+        return obj
+    for key, value in obj.items():
+        if isinstance(value, (dict, list)):
+            obj[key] = _resolve(value, large_arrays, threshold)
+    scalars = obj.get('scalars')
+    if isinstance(scalars, DeferredArray):
+        if large_arrays == 'load' or len(scalars) <= threshold:
+            obj['scalars'] = json.loads(scalars.text)
+        elif large_arrays == 'skip':
+            obj['scalars'] = None
+        else:
+            return ArrayProperty(**keys_to_snake_case(obj))
+    return obj
+
+
+class _ChunkReader(object):
+    """
+    Buffer over a file-like object that reads more text on demand.
+    """
+
+    def __init__(self, fp, chunk_size):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.consumed = 0
+        self.eof = False
+
+    def offset(self):
+        return self.consumed + self.pos
+
+    def read_more(self):
+        # read at least as much as is buffered, so re-scanning an element
+        # that spans many chunks costs linear time overall
+        self.buffer = self.buffer[self.pos:]
+        self.consumed += self.pos
+        self.pos = 0
+        chunk = self.fp.read(max(self.chunk_size, len(self.buffer)))
+        if not chunk:
+            self.eof = True
+        self.buffer += chunk
+
+    def next_char(self):
+        """Skips whitespace and returns the next character ('' at EOF)."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self.read_more()
+
+    def decode(self):
+        """Decodes the JSON value at the current position."""
+        decoder = json.JSONDecoder()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self.read_more()
+                continue
+            self.pos = end
+            return obj
+
+    def element(self):
+        """
+        Returns the text of the JSON object or array at the current
+        position, and the offsets into it of its numeric scalar arrays.
+        """
+        while True:
+            depth = 0
+            arrays = []
+            for match in _TOKEN.finditer(self.buffer, self.pos):
+                if match.group('array'):
+                    arrays.append((match.start('array') - self.pos, match.end() - self.pos))
+                elif match.group('open'):
+                    depth += 1
+                elif match.group('close'):
+                    depth -= 1
+                elif match.group('partial') or match.group('closed') == '':
+                    break  # token runs past the end of the buffer
+                if depth == 0:
+                    text = self.buffer[self.pos:match.end()]
+                    self.pos = match.end()
+                    return text, arrays
+            if self.eof:
+                raise ValueError('unterminated pif at offset {}'.format(self.offset()))
+            self.read_more()
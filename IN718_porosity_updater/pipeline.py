@@ -0,0 +1,115 @@
+"""
+Fused per-system transform pipelines.
+
+A transform of a pif dataset is registered as a named stage, either one
+that takes a single system or one that takes a batch of systems (for
+transforms vectorized across systems, like the pore statistics). A
+:class:`Pipeline` is composed from a list of stage names and runs every
+stage on a batch of systems before reading the next batch, so the
+dataset is streamed through all stages in a single pass, however many
+stages there are. The time spent in each stage is accumulated and can be
+reported, and each stage applied to a batch is a stage of the metrics
+(see :mod:`IN718_porosity_updater.metrics`), with the file it came from.
+The stages applied to a batch share the property indexes of its systems
+(see :meth:`PropertyIndex.shared
+<IN718_porosity_updater.property_index.PropertyIndex.shared>`).
+"""
+import time
+from collections import OrderedDict
+from itertools import islice
+
+from IN718_porosity_updater import metrics
+from IN718_porosity_updater.property_index import PropertyIndex
+
+
+STAGES = {}
+
+
+class Stage(object):
+    """
+    A named transform.
+
+    :param name: Name the stage is registered under.
+    :param func: ``func(system, context)`` returning the transformed system,
+        or None to drop it; for a batch stage ``func(systems, context)``
+        returning the list of transformed systems.
+    :param batch: Whether func takes a batch of systems.
+    """
+
+    def __init__(self, name, func, batch=False):
+        self.name = name
+        self.func = func
+        self.batch = batch
+
+    def __call__(self, systems, context):
+        if self.batch:
+            return list(self.func(systems, context))
+        transformed = (self.func(system, context) for system in systems)
+        return [system for system in transformed if system is not None]
+
+
+def register_stage(name, func, batch=False):
+    """
+    Registers a stage so pipelines can be composed from its name.
+
+    :param name: Stage name.
+    :param func: See :class:`Stage`.
+    :param batch: Whether func takes a batch of systems.
+    :return: The Stage.
+    """
+    STAGES[name] = Stage(name, func, batch=batch)
+    return STAGES[name]
+
+
+class Pipeline(object):
+    """
+    Stages fused into a single pass over a stream of systems.
+
+    :param stages: Stage names (looked up in ``STAGES``) or Stage objects,
+        in the order they are applied.
+    :param batch_size: Number of systems read and transformed at a time.
+    """
+
+    def __init__(self, stages, batch_size=256):
+        unknown = [s for s in stages if not isinstance(s, Stage) and s not in STAGES]
+        if unknown:
+            raise KeyError("unknown stage(s) {}; registered: {}".format(
+                ', '.join(unknown), ', '.join(sorted(STAGES))))
+        self.stages = [s if isinstance(s, Stage) else STAGES[s] for s in stages]
+        self.batch_size = batch_size
+        self.timings = OrderedDict((stage.name, 0.0) for stage in self.stages)
+        self.counts = OrderedDict((stage.name, 0) for stage in self.stages)
+
+    def run(self, systems, **context):
+        """
+        Applies the stages to systems.
+
+        :param systems: Iterable of pif systems; it is consumed lazily.
+        :param context: Passed to every stage as a dictionary (e.g. the
+            name of the file being transformed).
+        :return: Iterator of the transformed systems.
+        """
+        systems = iter(systems)
+        while True:
+            batch = list(islice(systems, self.batch_size))
+            if not batch:
+                return
+            with PropertyIndex.shared():
+                for stage in self.stages:
+                    self.counts[stage.name] += len(batch)
+                    start = time.perf_counter()
+                    with metrics.stage(stage.name, file=context.get('file')) as record:
+                        record.add(systems=len(batch))
+                        batch = stage(batch, context)
+                    self.timings[stage.name] += time.perf_counter() - start
+            for system in batch:
+                yield system
+
+    def report(self):
+        """
+        Prints the time spent in each stage.
+        """
+        total = sum(self.timings.values())
+        for name, seconds in self.timings.items():
+            print("STAGE: {:<24} {:9.3f} s {:6.1%}  {} systems".format(
+                name, seconds, seconds / total if total else 0.0, self.counts[name]))
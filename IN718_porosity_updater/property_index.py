@@ -0,0 +1,185 @@
+"""
+Name index of the properties of a pif system.
+
+The transforms look properties up by name again and again. A
+:class:`PropertyIndex` maps each property name to its position(s) in the
+system's property list, so lookups are dictionary lookups. Within a
+:meth:`PropertyIndex.shared` block (each batch of a pipeline run is one)
+:meth:`PropertyIndex.of` returns one index per system, so every transform
+applied to a system shares it; nothing is kept once the block exits. The
+index follows the system: if the property list is replaced, or properties
+are appended to it directly, the index catches up on the next access.
+"""
+import contextlib
+
+
+class PropertyIndex(object):
+    """
+    Index from property name to property of a pif system.
+
+    Properties with the same name are all indexed; lookups by name return
+    the first of them. Changes made through the index keep it up to date;
+    replacing a property of the list in place, other than with
+    :meth:`set`, is not noticed.
+
+    :param system: pif system (e.g. a ChemicalSystem).
+    """
+
+    # indexes of the current shared() block, by id of their system (which
+    # the index keeps alive, so ids are not reused while the block lasts)
+    _shared = None
+
+    @classmethod
+    @contextlib.contextmanager
+    def shared(cls):
+        """
+        Context manager within which :meth:`of` returns the same index for
+        a system every time. A block nested in another shares its indexes.
+        """
+        outer = cls._shared
+        if outer is None:
+            cls._shared = {}
+        try:
+            yield
+        finally:
+            cls._shared = outer
+
+    @classmethod
+    def of(cls, system):
+        """
+        The index of a system, shared within a :meth:`shared` block;
+        outside one a new index is returned.
+
+        :param system: pif system.
+        :return: PropertyIndex
+        """
+        if cls._shared is None:
+            return cls(system)
+        index = cls._shared.get(id(system))
+        if index is None:
+            index = cls._shared[id(system)] = cls(system)
+        return index
+
+    def __init__(self, system):
+        self.system = system
+        self._properties = None
+        self._positions = {}
+        self._indexed = 0
+        self._sync()
+
+    def _sync(self):
+        properties = self.system.properties
+        if properties is None:
+            properties = []
+        if properties is not self._properties or len(properties) < self._indexed:
+            self._properties = properties
+            self._positions = {}
+            self._indexed = 0
+        for i in range(self._indexed, len(properties)):
+            self._positions.setdefault(properties[i].name, []).append(i)
+        self._indexed = len(properties)
+        return properties
+
+    def __contains__(self, name):
+        self._sync()
+        return name in self._positions
+
+    def __getitem__(self, name):
+        prop = self.get(name)
+        if prop is None:
+            raise KeyError(name)
+        return prop
+
+    def __len__(self):
+        return len(self._sync())
+
+    def __iter__(self):
+        # iterates over the properties present when iteration starts, so
+        # appending while iterating is safe
+        properties = self._sync()
+        for i in range(len(properties)):
+            yield properties[i]
+
+    def names(self):
+        """
+        Names of the properties, in order of first appearance.
+
+        :return: list of str
+        """
+        self._sync()
+        return list(self._positions)
+
+    def get(self, name, default=None):
+        """
+        First property with the given name.
+
+        :param name: Property name.
+        :param default: Returned if there is no such property.
+        :return: Property
+        """
+        properties = self._sync()
+        positions = self._positions.get(name)
+        return properties[positions[0]] if positions else default
+
+    def get_all(self, name):
+        """
+        All properties with the given name, in order.
+
+        :param name: Property name.
+        :return: list of Property
+        """
+        properties = self._sync()
+        return [properties[i] for i in self._positions.get(name, ())]
+
+    def value(self, name, default=None):
+        """
+        Value of the (single) scalar of the first property with the given
+        name.
+
+        :param name: Property name.
+        :param default: Returned if there is no such property.
+        :return: The scalar's value.
+        """
+        prop = self.get(name)
+        if prop is None:
+            return default
+        scalars = prop.scalars
+        return scalars.value if hasattr(scalars, 'value') else scalars
+
+    def append(self, prop):
+        """
+        Appends a property to the system.
+
+        :param prop: Property.
+        """
+        if self.system.properties is None:
+            self.system.properties = []
+        self._sync().append(prop)
+        self._sync()
+
+    def set(self, prop):
+        """
+        Replaces the first property with the same name as prop, or appends
+        prop if there is none.
+
+        :param prop: Property.
+        """
+        properties = self._sync()
+        positions = self._positions.get(prop.name)
+        if positions:
+            properties[positions[0]] = prop
+        else:
+            self.append(prop)
+
+    def remove(self, name):
+        """
+        Removes every property with the given name.
+
+        :param name: Property name.
+        """
+        properties = self._sync()
+        if name in self._positions:
+            properties[:] = [prop for prop in properties if prop.name != name]
+            self._positions = {}
+            self._indexed = 0
+            self._sync()
@@ -0,0 +1,116 @@
+"""
+Sample ID index of a directory of porosity pifs.
+
+Each porosity pif describes a single sample. The index maps the Sample ID
+of every pif in the directory to the file holding it, so merging porosity
+data into the master systems is one dictionary lookup per system instead
+of a scan over every porosity file. The index is saved in the directory
+and only files that changed since it was written are read again.
+"""
+import json
+import os
+
+from IN718_porosity_updater import pif_io
+
+
+INDEX_NAME = '.sample_index'
+
+
+class SampleIndex(object):
+    """
+    Index from Sample ID to porosity pif.
+
+    :param directory: Directory of porosity pifs (``*.json``); the index is
+        stored in it as ``INDEX_NAME``.
+    :param save: Whether to write the updated index back to the directory.
+    """
+
+    def __init__(self, directory, save=True):
+        self.directory = directory
+        self.path = os.path.join(directory, INDEX_NAME)
+        saved = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as fh:
+                saved = json.load(fh)
+        self.files = {}
+        self.paths = {}
+        self.duplicates = {}
+        for f in sorted(os.listdir(directory)):
+            if ".json" not in f:
+                continue
+            stat = os.stat(os.path.join(directory, f))
+            key = [stat.st_size, stat.st_mtime_ns]
+            entry = saved.get(f)
+            if entry is None or entry[0] != key:
+                entry = [key, read_sample_id(os.path.join(directory, f))]
+            self.files[f] = entry
+            sample_id = entry[1]
+            if sample_id in self.paths:
+                self.duplicates.setdefault(sample_id, [self.paths[sample_id]]).append(f)
+            self.paths[sample_id] = f
+        self.matched = set()
+        if save and self.files != saved:
+            self.save()
+
+    def __contains__(self, sample_id):
+        return sample_id in self.paths
+
+    def __len__(self):
+        return len(self.paths)
+
+    def path_of(self, sample_id):
+        """
+        Path of the porosity pif of a sample.
+
+        :param sample_id: Sample ID.
+        :return: Path, or None if there is no porosity pif for the sample.
+        """
+        f = self.paths.get(sample_id)
+        return None if f is None else os.path.join(self.directory, f)
+
+    def load(self, sample_id, large_arrays='defer'):
+        """
+        Reads the porosity pif of a sample and marks the sample as matched.
+
+        :param sample_id: Sample ID.
+        :param large_arrays: Passed to :func:`pif_io.iterload`.
+        :return: The pif (e.g. a ChemicalSystem), or None if there is no
+            porosity pif for the sample.
+        """
+        path = self.path_of(sample_id)
+        if path is None:
+            return None
+        self.matched.add(sample_id)
+        with open(path, 'r') as fh:
+            system, = pif_io.iterload(fh, large_arrays=large_arrays)
+        return system
+
+    def unmatched(self):
+        """
+        Sample IDs that have a porosity pif but were never loaded.
+
+        :return: Sorted list of Sample IDs.
+        """
+        return sorted(set(self.paths) - self.matched)
+
+    def save(self):
+        """
+        Atomically writes the index.
+        """
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(self.files, fh, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def read_sample_id(path):
+    """
+    Sample ID of a porosity pif (the value of its first id), read without
+    decoding its per-pore arrays.
+
+    :param path: Path to the pif.
+    :return: str
+    """
+    with open(path, 'r') as fh:
+        system, = pif_io.iterload(fh, large_arrays='skip', threshold=0)
+    return system.ids[0].value
@@ -0,0 +1,264 @@
+"""
+Concurrent, resumable dataset transfers.
+
+Files are transferred by a bounded pool of threads, each transfer is
+retried with exponential backoff, and every completed transfer is written
+to a journal in the local directory together with the SHA-256 of the
+local file and, for downloads, the identity of the remote file (its
+checksum, size, version or modification time, whichever the listing
+reports). An interrupted or partly failed transfer can simply be run
+again: files whose journal entry matches the local file, and for
+downloads the current listing, are skipped. Files listed without any
+identity are always downloaded again.
+
+The transfers only use the data client methods ``get_dataset_files``,
+``download_files`` and ``upload`` (as provided by
+``CitrinationClient(...).data``), so any object implementing them, such
+as a local stand-in, can be used in place of the Citrination client.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from IN718_porosity_updater import metrics
+
+
+DOWNLOAD_JOURNAL = '.download_journal'
+UPLOAD_JOURNAL = '.upload_journal'
+
+# Attributes of a listed dataset file that identify its remote version
+IDENTITY_ATTRIBUTES = ('sha256', 'checksum', 'md5', 'etag', 'size', 'version', 'updated_at', 'last_modified')
+
+
+class TransferError(Exception):
+    """
+    Raised when the server reports that a transfer did not succeed.
+    """
+
+
+class Journal(object):
+    """
+    Record of the completed transfers of a local directory.
+
+    :param path: Path of the journal file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as fh:
+                self.entries = json.load(fh)
+
+    def is_done(self, key, local_path, remote=None):
+        """
+        Whether the transfer key was completed with the file as it is now.
+
+        :param key: Transfer key (e.g. the remote path).
+        :param local_path: Path of the local file.
+        :param remote: Identity of the remote file (see remote_identity)
+            that the transfer must have been recorded with, if any.
+        :return: bool
+        """
+        entry = self.entries.get(key)
+        return (entry is not None and entry.get('remote') == remote and os.path.exists(local_path) and
+                entry['size'] == os.path.getsize(local_path) and entry['sha256'] == file_sha256(local_path))
+
+    def record(self, key, local_path, remote=None):
+        """
+        Records a completed transfer and saves the journal.
+
+        :param key: Transfer key.
+        :param local_path: Path of the local file.
+        :param remote: Identity of the remote file, if any.
+        """
+        entry = {'size': os.path.getsize(local_path), 'sha256': file_sha256(local_path)}
+        if remote is not None:
+            entry['remote'] = remote
+        with self._lock:
+            self.entries[key] = entry
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as fh:
+                json.dump(self.entries, fh, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+
+
+def citrination_data_client(site='https://adapt.citrination.com'):
+    """
+    Data client of a Citrination site, authenticated with the key in the
+    CITRINATION_ADAPT_API_KEY environment variable. citrination_client is
+    only imported here, when a client is actually needed.
+
+    :param site: URL of the Citrination site.
+    :return: ``CitrinationClient(...).data``
+    """
+    from citrination_client import CitrinationClient
+    client = CitrinationClient(os.environ['CITRINATION_ADAPT_API_KEY'], site=site)
+    print(client)
+    return client.data
+
+
+def remote_identity(dataset_file):
+    """
+    Identity of a listed dataset file's remote version, built from the
+    IDENTITY_ATTRIBUTES the listing reports for it.
+
+    :param dataset_file: Entry of ``get_dataset_files``.
+    :return: str, or None if the listing has none of them.
+    """
+    parts = []
+    for name in IDENTITY_ATTRIBUTES:
+        value = getattr(dataset_file, name, None)
+        if value is not None and value != '':
+            parts.append('{}:{}'.format(name, value))
+    return ' '.join(parts) or None
+
+
+def file_sha256(path):
+    """
+    SHA-256 of a file's contents.
+
+    :param path: Path to the file.
+    :return: Hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def retry(func, attempts=5, backoff=1.0, max_backoff=60.0, sleep=None):
+    """
+    Calls func until it returns without raising.
+
+    :param func: Callable taking no arguments.
+    :param attempts: Maximum number of calls.
+    :param backoff: Wait before the first retry, in seconds; it doubles
+        after every further failure (with up to 50% random jitter).
+    :param max_backoff: Longest wait between two calls, in seconds.
+    :param sleep: Function used to wait (time.sleep by default).
+    :return: What func returns.
+    :raises: The exception of the last call if every call failed.
+    """
+    for attempt in range(attempts):
+        try:
+            return func()
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            delay = min(max_backoff, backoff * 2 ** attempt)
+            (sleep or time.sleep)(delay * (0.5 + random.random() / 2))
+
+
+def run_transfers(transfers, jobs=4):
+    """
+    Runs transfers on a bounded thread pool.
+
+    :param transfers: dict mapping a name to a callable performing the
+        transfer.
+    :param jobs: Maximum number of concurrent transfers.
+    :return: List of (name, exception) of the transfers that failed.
+    """
+    failures = []
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = [(name, executor.submit(func)) for name, func in transfers.items()]
+        for name, future in futures:
+            try:
+                future.result()
+            except Exception as error:
+                print("FAILED: ", name, repr(error))
+                failures.append((name, error))
+    return failures
+
+
+def download_dataset(data_client, dataset_id, destination, jobs=4, attempts=5, backoff=1.0):
+    """
+    Downloads every file of a dataset, skipping files already downloaded
+    unchanged according to the journal in destination: the local file
+    must be as downloaded and the listing must report the same remote
+    identity (see remote_identity) as at the download. Files listed
+    without an identity are always downloaded.
+
+    :param data_client: Data client (e.g. ``CitrinationClient(...).data``).
+    :param dataset_id: Dataset to download.
+    :param destination: Local directory; files keep their dataset paths
+        below it.
+    :param jobs: Maximum number of concurrent downloads.
+    :param attempts: Attempts per file (and for listing the dataset).
+    :param backoff: Initial retry wait, in seconds.
+    :return: List of (path, exception) of the files that failed.
+    """
+    journal = Journal(os.path.join(destination, DOWNLOAD_JOURNAL))
+    files = retry(lambda: data_client.get_dataset_files(dataset_id=dataset_id), attempts, backoff)
+    transfers = {}
+    for dataset_file in files:
+        local_path = os.path.join(destination, dataset_file.path)
+        key = '{}/{}'.format(dataset_id, dataset_file.path)
+        remote = remote_identity(dataset_file)
+        if remote is not None and journal.is_done(key, local_path, remote=remote):
+            print("UP TO DATE: ", local_path)
+            continue
+        transfers[dataset_file.path] = _download(data_client, dataset_file, destination, local_path, key, remote,
+                                                 journal, attempts, backoff)
+    print("Downloading {} of {} files...".format(len(transfers), len(files)))
+    return run_transfers(transfers, jobs)
+
+
+def _download(data_client, dataset_file, destination, local_path, key, remote, journal, attempts, backoff):
+    def transfer():
+        with metrics.stage('download', file=key) as record:
+            retry(lambda: data_client.download_files([dataset_file], destination=destination), attempts, backoff)
+            record.wrote(local_path)
+        journal.record(key, local_path, remote=remote)
+        print("DOWNLOADED: ", local_path)
+    return transfer
+
+
+def upload_directory(data_client, dataset_id, directory, jobs=4, attempts=5, backoff=1.0, pattern=".json"):
+    """
+    Uploads the files of a directory to a dataset, skipping files already
+    uploaded unchanged according to the journal in directory.
+
+    :param data_client: Data client (e.g. ``CitrinationClient(...).data``).
+    :param dataset_id: Dataset to upload to.
+    :param directory: Local directory.
+    :param jobs: Maximum number of concurrent uploads.
+    :param attempts: Attempts per file.
+    :param backoff: Initial retry wait, in seconds.
+    :param pattern: Only files whose name contains pattern are uploaded.
+    :return: List of (file name, exception) of the files that failed.
+    """
+    journal = Journal(os.path.join(directory, UPLOAD_JOURNAL))
+    transfers = {}
+    for f in sorted(os.listdir(directory)):
+        local_path = os.path.join(directory, f)
+        key = '{}/{}'.format(dataset_id, f)
+        if pattern not in f or not os.path.isfile(local_path):
+            continue
+        if journal.is_done(key, local_path):
+            print("UP TO DATE: ", local_path)
+            continue
+        transfers[f] = _upload(data_client, dataset_id, f, local_path, key, journal, attempts, backoff)
+    return run_transfers(transfers, jobs)
+
+
+def _upload(data_client, dataset_id, f, local_path, key, journal, attempts, backoff):
+    def upload():
+        result = data_client.upload(dataset_id, local_path, dest_path=f)
+        if hasattr(result, 'successful') and not result.successful():
+            raise TransferError("upload of {} failed: {}".format(local_path, getattr(result, 'failures', result)))
+        return result
+
+    def transfer():
+        with metrics.stage('upload', file=key) as record:
+            retry(upload, attempts, backoff)
+            record.read(local_path)
+        journal.record(key, local_path)
+        print("UPLOADED: ", local_path)
+    return transfer
@@ -1,261 +1,617 @@
 import os
 import math
-import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import pandas as pd
-from citrination_client import CitrinationClient
-from pypif import pif
 from pypif.obj import *
 from IN718_porosity_updater.pore_statistics import *
-sys.path.insert(0, '/Users/cborg/projects/community_projects/')
-from community_projects.pycc_utils import pycc_wrappers
+from IN718_porosity_updater.ingest import VOLUME, read_pore_csv, load_sidecar
+from IN718_porosity_updater.manifest import Manifest
+from IN718_porosity_updater.array_property import ArrayProperty, scalar_values
+from IN718_porosity_updater.sample_index import SampleIndex
+from IN718_porosity_updater.property_index import PropertyIndex
+from IN718_porosity_updater.pipeline import Pipeline, register_stage
+from IN718_porosity_updater.dataset_cache import DatasetCache
+from IN718_porosity_updater.transfer import citrination_data_client, download_dataset, upload_directory
+from IN718_porosity_updater.mirror import DatasetMirror
+from IN718_porosity_updater import metrics, pif_io
 
+# Bump whenever a change alters the pifs written by the pipeline, so that
+# incremental rebuilds (see manifest.Manifest) recompute their outputs.
+PIPELINE_VERSION = 3
 
-def parse_csv(csv_file_dir, pif_dir):
+
+def parse_csv(csv_file_dir, pif_dir, chunksize=None, relative_accuracy=0.01, cluster_distance=None,
+              use_cache=True, jobs=1, incremental=False):
 
     """
     Takes in csv file from dataset 73, returns pif system
     _full.csv = total volume of part
-    :return:
+
+    If chunksize is given, each pore csv is streamed in chunks of that many
+    rows and only summary statistics are stored (no per-pore properties);
+    the median is then approximate to within relative_accuracy.
+
+    Pores whose centers are chained by gaps of at most cluster_distance
+    (in um) are reported as clusters. By default the distance is scaled to
+    each scan: CLUSTER_DIAMETERS times its median pore diameter.
+
+    Parsed columns are cached in a binary sidecar next to each csv (see
+    ingest.read_pore_csv) unless use_cache is False.
+
+    Each pore csv is paired with its _full.csv (total volume of the part)
+    up front, and parsed, along with its fraction porosity, by one of jobs
+    worker processes (see run_per_file); every pif is written once.
+
+    If incremental is set, pifs whose pore csv, _full.csv and options are
+    unchanged since they were last built (per the manifest in pif_dir) are
+    skipped.
+    :return: list of (task, exception) for the csvs that failed
     """
-    csv_files = [f for f in os.listdir(csv_file_dir) if ".csv" in f and "_full" not in f]
-    full_csv_files = [f for f in os.listdir(csv_file_dir) if "_full.csv" in f]
+    csv_files = sorted(f for f in os.listdir(csv_file_dir) if ".csv" in f and "_full" not in f)
+    full_csv_files = set(f for f in os.listdir(csv_file_dir) if "_full.csv" in f)
 
+    tasks = []
     for f in csv_files:
-        df = pd.read_csv(csv_file_dir+f, encoding="utf-16")
-
-        system = ChemicalSystem()
-        sample_id = f.strip(".csv")
-        system.ids = [Id(name='Sample ID', value=sample_id)]
-
-        cm_x = [Scalar(value=x) for x in df['Center Of Mass X (µm)']]
-        cm_y = [Scalar(value=x) for x in df['Center Of Mass Y (µm)']]
-        cm_z = [Scalar(value=x) for x in df['Center Of Mass Z (µm)']]
-
-        method = Method(name='porosity', software=Software(name='tracr', version='beta'))
-        prop_x = Property(name='center of mass X', scalars=cm_x, units='$\mu m$', method=method)
-        prop_y = Property(name='center of mass Y', scalars=cm_y, units='$\mu m$', method=method)
-        prop_z = Property(name='center of mass Z', scalars=cm_z, units='$\mu m$', method=method)
-        system.properties = [prop_x, prop_y, prop_z]
-
-        # calc pore stats
-        pore_stats = ['neighbor pore distance', 'median pore diameter', 'median pore spacing',
-                      'mean pore spacing', 'max pore diameter',  'pore volume', 'pore diameters',
-                      'stdev of pore diameters', 'total pores']
-
-        for prop_name in pore_stats:
-            prop = Property()
-            prop.name = prop_name
-            if prop_name == 'median pore diameter':
-                prop.scalars = Scalar(value=median_pore_diameter(df['Volume (µm³)']))
-                prop.units = "$\mu m$"
-            if prop_name == 'neighbor pore distance':
-                prop.scalars = [Scalar(value=x) for x in nearest_neighbor_distance(df['Center Of Mass X (µm)'],
-                                                                                   df['Center Of Mass Y (µm)'],
-                                                                                   df['Center Of Mass Z (µm)'])]
-                prop.units = '$\mu m$'
-            if prop_name == 'median pore spacing':
-                prop.scalars = Scalar(value=median_pore_spacing(df['Center Of Mass X (µm)'],
-                                                                df['Center Of Mass Y (µm)'],
-                                                                df['Center Of Mass Z (µm)']))
-                prop.units = '$\mu m$'
-            if prop_name == 'mean pore spacing':
-                prop.scalars = Scalar(value=mean_pore_spacing(df['Center Of Mass X (µm)'],
-                                                              df['Center Of Mass Y (µm)'],
-                                                              df['Center Of Mass Z (µm)']))
-                prop.units = '$\mu m$'
-            if prop_name == 'max pore diameter':
-                prop.scalars = Scalar(value=max_pore_diameter(df['Volume (µm³)']))
-                prop.units = '$\mu m$'
-
-            if prop_name == 'pore volume':
-                prop.scalars = [Scalar(value=x) for x in df['Volume (µm³)']]
-                prop.units = '${\mu m}^3$'
-
-            if prop_name == 'pore diameters':
-                prop.scalars = [Scalar(value=x) for x in sphere_equivalent_diameter(df['Volume (µm³)'])]
-                prop.units = '$\mu m$'
-
-            if prop_name == 'stdev of pore diameters':
-                prop.scalars = Scalar(value=round(np.std(sphere_equivalent_diameter(df['Volume (µm³)'])), 3))
-                prop.units = '$\mu m$'
-
-            if prop_name == 'total pores':
-                prop.scalars = Scalar(value=len(df['Volume (µm³)']))
-
-            system.properties.append(prop)
-
-        print(pif.dumps(system.ids))
-        outfile_path = pif_dir+f.replace('.csv', '.json')
-        pif.dump(system, open(outfile_path, 'w'))
-
-    for f in full_csv_files:
-
-        df = pd.read_csv(csv_file_dir+f, encoding="utf-16")
-
-        outfile_path = f.replace('_full.csv', '.json')
-
-        if outfile_path in os.listdir(pif_dir):
-            system = pif.load(open(pif_dir+outfile_path, 'r'))
-            # system.properties.append(Property(name='Full part volume', scalars=df['Volume (µm³)'], units='${\mu m}^3$'))
-            for prop in system.properties:
-                if prop.name == 'pore volume':
-                    total_porosity_vol = sum([sca.value for sca in prop.scalars])
-                    fractional_porosity = round(float(total_porosity_vol / df['Volume (µm³)']), 6)
-                    system.properties.append(Property(name='fraction porosity', scalars=fractional_porosity))
-
-            pif.dump(system, open(pif_dir+outfile_path, 'w'))
-            print("Fraction porosity calc: ", outfile_path)
-
-
-def get_files_from_dataset(dataset_id, download_path):
-
-    client = CitrinationClient(os.environ['CITRINATION_ADAPT_API_KEY'], site='https://adapt.citrination.com')
-    print(client)
-    files = client.data.get_dataset_files(dataset_id=dataset_id)
-    print("Downloading {} files...".format(len(files)))
-    client.data.download_files(files, destination=download_path)
+        full_csv = f.replace('.csv', '_full.csv')
+        full_csv_path = csv_file_dir+full_csv if full_csv in full_csv_files else None
+        tasks.append((csv_file_dir+f, pif_dir+f.replace('.csv', '.json'), full_csv_path))
+    options = dict(chunksize=chunksize, relative_accuracy=relative_accuracy,
+                   cluster_distance=cluster_distance, use_cache=use_cache)
+    if incremental:
+        manifest = Manifest(pif_dir)
+        params = dict(options, pipeline=PIPELINE_VERSION, statistics=STATISTICS_VERSION)
+        tasks = [task for task in tasks if not manifest.is_current(task[1], _task_inputs(task), **params)]
+        print("REBUILDING: {} of {} pifs".format(len(tasks), len(csv_files)))
+
+    results, failures = run_per_file(parse_pore_csv, tasks, jobs=jobs, **options)
+    for task, outfile_path in zip(tasks, results):
+        if outfile_path is not None:
+            print("PARSED: ", outfile_path)
+            if incremental:
+                manifest.record(outfile_path, _task_inputs(task), **params)
+    if incremental:
+        manifest.save()
+
+    return failures
+
+
+def _task_inputs(task):
+    csv_path, pif_path, full_csv_path = task
+    return [csv_path] if full_csv_path is None else [csv_path, full_csv_path]
+
+
+def parse_pore_csv(csv_path, pif_path, full_csv_path=None, chunksize=None, relative_accuracy=0.01,
+                   cluster_distance=None, use_cache=True):
+
+    """
+    Parses a single tracr pore csv and writes its pif system to pif_path.
+    If the _full.csv of the part is given, the fraction porosity is added.
+    See parse_csv for the options.
+    :return: pif_path
+    """
+    with metrics.stage('parse csv', file=os.path.basename(csv_path)) as record:
+        _parse_pore_csv(csv_path, pif_path, full_csv_path, chunksize, relative_accuracy, cluster_distance,
+                        use_cache)
+        record.read(csv_path)
+        if full_csv_path is not None:
+            record.read(full_csv_path)
+        record.wrote(pif_path)
+    return pif_path
+
+
+def _parse_pore_csv(csv_path, pif_path, full_csv_path, chunksize, relative_accuracy, cluster_distance, use_cache):
+
+    sample_id = os.path.basename(csv_path).strip(".csv")
+    if chunksize:
+        pore_stats = stream_pore_statistics(csv_path, chunksize=chunksize, relative_accuracy=relative_accuracy)
+        metrics.count(pores=pore_stats.total_pores)
+        system = streamed_porosity_system(sample_id, pore_stats)
+        if full_csv_path is not None:
+            system.properties.append(fraction_porosity_prop(pore_stats.total_pore_volume, full_csv_path, use_cache))
+        with pif_io.open_output(pif_path) as fh:
+            pif_io.dump(system, fh)
+        return pif_path
+
+    df = read_pore_csv(csv_path, use_cache=use_cache)
+    metrics.count(pores=len(df['Volume (µm³)']))
+
+    system = ChemicalSystem()
+    system.ids = [Id(name='Sample ID', value=sample_id)]
+
+    method = Method(name='porosity', software=Software(name='tracr', version='beta'))
+    prop_x = ArrayProperty(name='center of mass X', scalars=df['Center Of Mass X (µm)'], units='$\mu m$', method=method)
+    prop_y = ArrayProperty(name='center of mass Y', scalars=df['Center Of Mass Y (µm)'], units='$\mu m$', method=method)
+    prop_z = ArrayProperty(name='center of mass Z', scalars=df['Center Of Mass Z (µm)'], units='$\mu m$', method=method)
+    system.properties = [prop_x, prop_y, prop_z]
+
+    # calc pore stats
+    pore_stats = PoreStatistics(df['Volume (µm³)'],
+                                df['Center Of Mass X (µm)'],
+                                df['Center Of Mass Y (µm)'],
+                                df['Center Of Mass Z (µm)'])
+    pore_stat_names = ['neighbor pore distance', 'median pore diameter', 'median pore spacing',
+                       'mean pore spacing', 'max pore diameter',  'pore volume', 'pore diameters',
+                       'stdev of pore diameters', 'total pores', 'pore cluster labels',
+                       'pore cluster count', 'largest pore cluster']
+    if pore_stats.total_pores < 2:
+        # a lone pore has no neighbor, so there is no spacing to report
+        pore_stat_names = [name for name in pore_stat_names
+                           if name not in ('neighbor pore distance', 'median pore spacing', 'mean pore spacing')]
+    cluster_labels = pore_stats.clusters(cluster_distance)
+    cluster_sizes = np.bincount(cluster_labels[cluster_labels >= 0])
+
+    for prop_name in pore_stat_names:
+        prop = ArrayProperty()
+        prop.name = prop_name
+        if prop_name == 'median pore diameter':
+            prop.scalars = Scalar(value=pore_stats.median_pore_diameter)
+            prop.units = "$\mu m$"
+        if prop_name == 'neighbor pore distance':
+            prop.scalars = pore_stats.neighbor_distances
+            prop.units = '$\mu m$'
+        if prop_name == 'median pore spacing':
+            prop.scalars = Scalar(value=pore_stats.median_pore_spacing)
+            prop.units = '$\mu m$'
+        if prop_name == 'mean pore spacing':
+            prop.scalars = Scalar(value=pore_stats.mean_pore_spacing)
+            prop.units = '$\mu m$'
+        if prop_name == 'max pore diameter':
+            prop.scalars = Scalar(value=pore_stats.max_pore_diameter)
+            prop.units = '$\mu m$'
+
+        if prop_name == 'pore volume':
+            prop.scalars = pore_stats.volume
+            prop.units = '${\mu m}^3$'
+
+        if prop_name == 'pore diameters':
+            prop.scalars = pore_stats.diameters
+            prop.units = '$\mu m$'
+
+        if prop_name == 'stdev of pore diameters':
+            prop.scalars = Scalar(value=round(pore_stats.stdev_pore_diameter, 3))
+            prop.units = '$\mu m$'
+
+        if prop_name == 'total pores':
+            prop.scalars = Scalar(value=pore_stats.total_pores)
+
+        if prop_name == 'pore cluster labels':
+            prop.scalars = cluster_labels
+
+        if prop_name == 'pore cluster count':
+            prop.scalars = Scalar(value=len(cluster_sizes))
+
+        if prop_name == 'largest pore cluster':
+            prop.scalars = Scalar(value=int(cluster_sizes.max()) if len(cluster_sizes) else 0)
+
+        system.properties.append(prop)
+
+    if full_csv_path is not None:
+        system.properties.append(fraction_porosity_prop(pore_stats.total_pore_volume, full_csv_path, use_cache))
+
+    with pif_io.open_output(pif_path) as fh:
+        pif_io.dump(system, fh)
+    return pif_path
+
+
+def fraction_porosity_prop(total_pore_volume, full_csv_path, use_cache=True):
+
+    """
+    Fraction porosity of a part, given its total pore volume and the
+    _full.csv holding the volume of the whole part.
+    """
+    part_volume = read_pore_csv(full_csv_path, columns=[VOLUME], use_cache=use_cache)[VOLUME][0]
+    return Property(name='fraction porosity', scalars=round(float(total_pore_volume / part_volume), 6))
+
+
+def run_per_file(func, tasks, jobs=1, **kwargs):
+
+    """
+    Calls func(*task, **kwargs) for every task, in a pool of jobs worker
+    processes if jobs > 1 (jobs <= 0 uses every core). A failing task is
+    reported and does not stop the others. Metrics recorded in the workers
+    are passed on to the recorder of this process.
+    :return: (results in task order, None for failed tasks; list of (task, exception))
+    """
+    if jobs is not None and jobs <= 0:
+        jobs = os.cpu_count()
+    results = [None]*len(tasks)
+    failures = []
+    if not jobs or jobs == 1 or len(tasks) < 2:
+        for i, task in enumerate(tasks):
+            try:
+                results[i] = func(*task, **kwargs)
+            except Exception as err:
+                print("FAILED: ", task[0], repr(err))
+                failures.append((task, err))
+        return results, failures
+
+    recorded = metrics.current().enabled
+    call = partial(metrics.run_recorded, func) if recorded else func
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(call, *task, **kwargs) for task in tasks]
+        for i, (task, future) in enumerate(zip(tasks, futures)):
+            try:
+                results[i] = future.result()
+                if recorded:
+                    results[i], records = results[i]
+                    metrics.emit_all(records)
+            except Exception as err:
+                print("FAILED: ", task[0], repr(err))
+                failures.append((task, err))
+    return results, failures
+
+
+def stream_pore_statistics(csv_path, chunksize=100000, relative_accuracy=0.01):
+
+    """
+    Reads the pore volumes of a tracr csv in chunks of chunksize rows, so
+    peak memory does not depend on the number of pores. An up-to-date binary
+    sidecar is memory-mapped and sliced instead of parsing the csv.
+    :return: StreamingPoreStatistics for the whole file
+    """
+    pore_stats = StreamingPoreStatistics(relative_accuracy=relative_accuracy)
+    cached = load_sidecar(csv_path, columns=[VOLUME])
+    if cached is not None:
+        for start in range(0, len(cached[VOLUME]), chunksize):
+            pore_stats.update(cached[VOLUME][start:start + chunksize])
+        return pore_stats
+    for chunk in pd.read_csv(csv_path, encoding="utf-16", usecols=['Volume (µm³)'], chunksize=chunksize):
+        pore_stats.update(chunk['Volume (µm³)'].values)
+    return pore_stats
+
+
+def streamed_porosity_system(sample_id, pore_stats):
+
+    """
+    Builds a pif system holding only the summary statistics of a
+    StreamingPoreStatistics.
+    """
+    system = ChemicalSystem()
+    system.ids = [Id(name='Sample ID', value=sample_id)]
+    system.properties = [
+        Property(name='median pore diameter', units='$\mu m$',
+                 scalars=Scalar(value=pore_stats.median_pore_diameter, approximate=True)),
+        Property(name='max pore diameter', scalars=Scalar(value=pore_stats.max_pore_diameter), units='$\mu m$'),
+        Property(name='mean pore diameter', scalars=Scalar(value=pore_stats.mean_pore_diameter), units='$\mu m$'),
+        Property(name='stdev of pore diameters', scalars=Scalar(value=round(pore_stats.stdev_pore_diameter, 3)),
+                 units='$\mu m$'),
+        Property(name='total pores', scalars=Scalar(value=pore_stats.total_pores)),
+        Property(name='total pore volume', scalars=Scalar(value=pore_stats.total_pore_volume), units='${\mu m}^3$')]
+    for name, count in zip(diameter_bucket_names(pore_stats.bucket_edges), pore_stats.bucket_counts):
+        system.properties.append(Property(name=name, scalars=int(count)))
+    return system
+
+
+def get_files_from_dataset(dataset_id, download_path, jobs=4, attempts=5, data_client=None, mirror_dir=None,
+                           offline=False):
+
+    """
+    Downloads the files of a dataset, jobs at a time, retrying each up to
+    attempts times. Files already downloaded unchanged are skipped, so an
+    interrupted download can be resumed by running it again.
+
+    If mirror_dir is given, the dataset is synced into the DatasetMirror
+    there (only changed files are fetched; nothing is fetched if offline
+    is set) and download_path gets read-only hard links to the mirror.
+    :return: list of (path, exception) of the files that failed
+    """
+    if data_client is None and not offline:
+        data_client = citrination_data_client()
+    if mirror_dir is None:
+        return download_dataset(data_client, dataset_id, download_path, jobs=jobs, attempts=attempts)
+    mirror = DatasetMirror(mirror_dir)
+    failures = [] if offline else mirror.sync(data_client, dataset_id, jobs=jobs, attempts=attempts)
+    for path in mirror.checkout(dataset_id, download_path):
+        print("CHECKED OUT: ", path)
+    return failures
 
 
 def add_identifiers_to_pifs(systems, f):
 
     for system in systems:
-        for prep in system.preparation:
-            if prep.name == 'printing':
-                for det in prep.details:
-                    if det.name == 'row':
-                        row_id = det.scalars
-                    if det.name == 'column':
-                        column_id = det.scalars
-        if row_id >= 10:
-            sample_id = f.replace("-nohough.json", "") + "_" + column_id + str(row_id)
-        else:
-            sample_id = f.replace("-nohough.json", "") + "_" + column_id + "0" + str(row_id)
-
-        system.ids = [Id(name='Sample ID', value=sample_id)]
-
+        add_identifiers_to_system(system, f)
     return systems
 
 
+def add_identifiers_to_system(system, f):
+
+    for prep in system.preparation:
+        if prep.name == 'printing':
+            for det in prep.details:
+                if det.name == 'row':
+                    row_id = det.scalars
+                if det.name == 'column':
+                    column_id = det.scalars
+    if row_id >= 10:
+        sample_id = f.replace("-nohough.json", "") + "_" + column_id + str(row_id)
+    else:
+        sample_id = f.replace("-nohough.json", "") + "_" + column_id + "0" + str(row_id)
+
+    system.ids = [Id(name='Sample ID', value=sample_id)]
+    return system
+
+
 def add_heat_treatment_to_pifs(systems, f):
 
     for system in systems:
-        if "P001_B001" in f:
-            system.preparation.append(
-                ProcessStep(name="Plate heat treatment", details=Value(name="Heat treatment performed", scalars="YES")))
-        else:
-            system.preparation.append(
-                ProcessStep(name="Plate heat treatment", details=Value(name="Heat treatment performed", scalars="NO")))
+        add_heat_treatment_to_system(system, f)
     return systems
 
 
-def modify_master_dataset(master_branch_dir, develop_branch_dir):
+def add_heat_treatment_to_system(system, f):
+
+    if "P001_B001" in f:
+        system.preparation.append(
+            ProcessStep(name="Plate heat treatment", details=Value(name="Heat treatment performed", scalars="YES")))
+    else:
+        system.preparation.append(
+            ProcessStep(name="Plate heat treatment", details=Value(name="Heat treatment performed", scalars="NO")))
+    return system
+
+
+def modify_master_dataset(master_branch_dir, develop_branch_dir, porosity_json_dir=None, incremental=False,
+                          stages=None, batch_size=256):
+
+    """
+    Adds identifiers, heat treatment and porosity data and statistics to
+    every master branch pif and writes the result to the develop branch.
+
+    The transforms are the pipeline stages named in stages (MASTER_STAGES
+    by default); each master pif is streamed through all of them in one
+    pass, batch_size systems at a time, and the time spent in each stage
+    is reported at the end.
 
-    for f in os.listdir(master_branch_dir):
+    If incremental is set, develop pifs whose master pif and porosity pifs
+    are unchanged since they were last built are skipped. The Sample IDs of
+    each develop pif are recorded in the manifest, so only the porosity
+    pifs of those samples are inputs of it, and a porosity pif arriving
+    for one of them triggers a rebuild.
+
+    The porosity pifs are only read if the 'porosity data' stage is run.
+    """
+    if stages is None:
+        stages = MASTER_STAGES
+    pipeline = Pipeline(stages, batch_size=batch_size)
+    porosity_index = None
+    if 'porosity data' in stages:
+        if porosity_json_dir is None:
+            porosity_json_dir = base_download_path+"data/porosity_jsons/"
+        porosity_index = SampleIndex(porosity_json_dir)
+        for sample_id, files in sorted(porosity_index.duplicates.items()):
+            print("DUPLICATE POROSITY DATA: ", sample_id, files)
+    skipped = False
+    if incremental:
+        manifest = Manifest(develop_branch_dir)
+        params = dict(pipeline=PIPELINE_VERSION, statistics=STATISTICS_VERSION, stages=list(stages))
+
+    for f in sorted(os.listdir(master_branch_dir)):
 
         if ".json" in f:
-            systems = pif.load(open(master_branch_dir + f))
-            systems = add_identifiers_to_pifs(systems, f)
-            systems = add_heat_treatment_to_pifs(systems, f)
-            systems = add_porosity_data_to_pifs(systems, base_download_path+"data/porosity_jsons/")
-            systems = add_porosity_stats_to_pifs(systems)
-            systems = add_pore_diameter_bucket_prop(systems)
-            systems = remove_unverified_pore_data(systems)
             outfile_path = develop_branch_dir+f
-            pif.dump(systems, open(outfile_path, "w"))
+            if incremental:
+                samples = manifest.recorded_params(outfile_path).get('samples')
+                if samples is not None and manifest.is_current(
+                        outfile_path, _master_inputs(master_branch_dir+f, samples, porosity_index),
+                        samples=samples, **params):
+                    print("UP TO DATE: ", outfile_path)
+                    skipped = True
+                    continue
+
+            with metrics.stage('modify master', file=f) as record:
+                with open(master_branch_dir + f) as infile, pif_io.open_output(outfile_path) as outfile, \
+                        pif_io.PifWriter(outfile) as writer:
+                    systems = pif_io.iterload(infile, large_arrays='defer')
+                    samples = []
+                    for system in pipeline.run(systems, file=f, porosity_index=porosity_index):
+                        writer.write(system)
+                        if system.ids:
+                            samples.append(system.ids[0].value)
+                record.read(master_branch_dir + f)
+                record.wrote(outfile_path)
+                record.add(systems=writer.count)
             print("DUMPED: ", outfile_path)
 
+            if incremental:
+                samples = sorted(set(samples))
+                manifest.record(outfile_path, _master_inputs(master_branch_dir+f, samples, porosity_index),
+                                samples=samples, **params)
+                manifest.save()
+
+    pipeline.report()
+
+    # samples of skipped files were not looked up, so only a full run can
+    # tell which porosity pifs have no master system
+    if porosity_index is not None and not skipped:
+        for sample_id in porosity_index.unmatched():
+            print("UNMATCHED POROSITY DATA: ", porosity_index.path_of(sample_id))
+
+
+def _master_inputs(master_path, samples, porosity_index):
+
+    """
+    Inputs of a develop pif: its master pif and the porosity pifs, among
+    those indexed, of its Sample IDs.
+    """
+    inputs = [master_path]
+    if porosity_index is not None:
+        inputs += [porosity_index.path_of(sample_id) for sample_id in samples if sample_id in porosity_index]
+    return inputs
+
+
 def remove_unverified_pore_data(systems):
 
+    for system in systems:
+        remove_unverified_pore_data_from_system(system)
+    return systems
+
+
+def remove_unverified_pore_data_from_system(system):
+
     unverified_ids = ['P001_B001_X13', 'P001_B001_B03', 'P001_B001_B14']
-    if system in systems:
-        if system.ids[0].value in unverified_ids:
-            system.properties = []
+    if system.ids[0].value in unverified_ids:
+        system.properties = []
+    return system
+
+
+def diameter_bucket_names(edges=DIAMETER_BUCKET_EDGES):
+
+    """
+    Property names of the diameter buckets produced by diameter_histogram,
+    e.g. 'pore diameter < 50 um', 'pore diameter 50 < x < 100 um', ...,
+    'pore diameter x > 200 um'.
+    """
+    edges = ['{:g}'.format(edge) for edge in edges]
+    names = ['pore diameter < {} um'.format(edges[0])]
+    names += ['pore diameter {} < x < {} um'.format(lo, hi) for lo, hi in zip(edges[:-1], edges[1:])]
+    names.append('pore diameter x > {} um'.format(edges[-1]))
+    return names
 
-    return systems
 
-def add_pore_diameter_bucket_prop(systems):
+def add_pore_diameter_bucket_prop(systems, edges=DIAMETER_BUCKET_EDGES):
 
+    bucketed = []
+    diameters = []
     for system in systems:
-        if system.properties:
-            for prop in system.properties:
-                if prop.name == 'pore diameters':
-                    system.properties.append(Property(name='pore diameter < 50 um', scalars=len([i for i in prop.scalars if float(i.value) < 50])))
-                    system.properties.append(Property(name='pore diameter 50 < x < 100 um', scalars=len([i for i in prop.scalars if 50 < float(i.value) < 100])))
-                    system.properties.append(Property(name='pore diameter 100 < x < 150 um', scalars=len([i for i in prop.scalars if 100 < float(i.value) < 150])))
-                    system.properties.append(Property(name='pore diameter 150 < x < 200 um', scalars=len([i for i in prop.scalars if 150 < float(i.value) < 200])))
-                    system.properties.append(Property(name='pore diameter x > 200 um', scalars=len([i for i in prop.scalars if float(i.value) > 200])))
+        props = PropertyIndex.of(system)
+        prop = props.get('pore diameters')
+        if prop is not None:
+            bucketed.append(props)
+            diameters.append(scalar_values(prop))
+
+    values, offsets = concatenate_samples(diameters)
+    counts = diameter_histogram(values, edges, offsets)
+    names = diameter_bucket_names(edges)
+    for props, system_counts in zip(bucketed, counts):
+        for name, count in zip(names, system_counts):
+            props.append(Property(name=name, scalars=int(count)))
     return systems
 
 def add_porosity_data_to_pifs(systems, data_porosity_jsons):
 
-    for f in os.listdir(data_porosity_jsons):
-        if ".json" in f:
-            porosity_data_system = pif.load(open(data_porosity_jsons+f, "r"))
-            porosity_system_sample_id = porosity_data_system.ids[0].value
-            for system in systems:
-                main_system_sample_id = system.ids[0].value
-                if main_system_sample_id == porosity_system_sample_id:
-                    system.properties = porosity_data_system.properties
+    """
+    Replaces the properties of every system that has a porosity pif with
+    the porosity pif's properties. data_porosity_jsons is the directory of
+    porosity pifs or a SampleIndex of it.
+    """
+    if isinstance(data_porosity_jsons, SampleIndex):
+        porosity_index = data_porosity_jsons
+    else:
+        porosity_index = SampleIndex(data_porosity_jsons)
+    for system in systems:
+        add_porosity_data_to_system(system, porosity_index)
 
     return systems
 
 
+def add_porosity_data_to_system(system, porosity_index):
+
+    main_system_sample_id = system.ids[0].value
+    porosity_data_system = porosity_index.load(main_system_sample_id)
+    if porosity_data_system is None:
+        print("NO POROSITY DATA: ", main_system_sample_id)
+    else:
+        system.properties = porosity_data_system.properties
+    return system
+
+
+# Candidates for dist_best_fit, in the order ties are broken; the property
+# holds the upper-cased name ('NORM', 'LOGNORM', 'WEIBULL' or 'GUMBEL')
+BEST_FIT_DISTRIBUTIONS = ('lognorm', 'norm', 'weibull', 'gumbel')
+
+
 def add_porosity_stats_to_pifs(systems):
 
-    for system in systems:
-        if system.properties:
-            prop_names = [prop.name for prop in system.properties]
-            for prop in system.properties:
-                if prop.name == 'pore volume':
-
-                    pore_volumes = [float(sca.value) for sca in prop.scalars]
-                    r_squared_norm = round(qq_normal(sphere_equivalent_diameter(pore_volumes))[2]**2, 4)
-                    r_squared_lognorm = round(qq_lognormal(sphere_equivalent_diameter(pore_volumes))[2]**2, 4)
-                    system.properties.append(Property(name='r_squared_norm', scalars=r_squared_norm))
-                    system.properties.append(Property(name='r_squared_lognorm', scalars=r_squared_lognorm))
-                    if r_squared_norm > r_squared_lognorm:
-                        system.properties.append(Property(name='dist_best_fit', scalars='NORM'))
-                    else:
-                        system.properties.append(Property(name='dist_best_fit', scalars='LOGNORM'))
-
-                    if 'pore diameters' not in prop_names:
-                        pore_diameters = [Scalar(value=x) for x in sphere_equivalent_diameter(pore_volumes)]
-                        system.properties.append(Property(name='pore diameters', scalars=pore_diameters, units='$\mu m$'))
-
-                    if 'stdev of pore diameters' not in prop_names:
-                        stdev = Scalar(value=round(np.std(sphere_equivalent_diameter(pore_volumes)), 3))
-                        system.properties.append(Property(name='stdev of pore diameters', scalars=stdev, units='$\mu m$'))
-
-                    if 'total pores' not in prop_names:
-                        total_pores = Scalar(value=len(pore_volumes))
-                        system.properties.append(Property(name='total pores', scalars=total_pores))
-
-                if prop.name == 'max pore diameter':
-                    mpd = float(prop.scalars.value)
-                    if mpd > 200:
-                        system.properties.append(Property(name='Pore size warning', scalars='RED'))
-                    else:
-                        system.properties.append(Property(name='Pore size warning', scalars='GREEN'))
-
-                    if mpd > 200:
-                        system.properties.append(Property(name='Pore size warning (ternary)', scalars='RED'))
-                    elif 75 < mpd < 200:
-                        system.properties.append(Property(name='Pore size warning (ternary)', scalars='YELLOW'))
-                    else:
-                        system.properties.append(Property(name='Pore size warning (ternary)', scalars='GREEN'))
-
-                    system.properties.append(Property(name="log max pore diameter", scalars=Scalar(value=math.log10(mpd))))
-
-                if prop.name == 'median pore diameter':
-                    if prop.scalars.value > 22:
-                        system.properties.append(Property(name='Median pore classifier', scalars='>22 um'))
-                    else:
-                        system.properties.append(Property(name='Median pore classifier', scalars='<22 um'))
+    # pore statistics and goodness of fit are computed for all systems at once
+    fit_index = {}
+    pore_volumes = []
+    for n, system in enumerate(systems):
+        prop = PropertyIndex.of(system).get('pore volume')
+        if prop is not None:
+            fit_index[n] = len(pore_volumes)
+            pore_volumes.append(scalar_values(prop))
+    pore_stats = RaggedPoreStatistics(*concatenate_samples(pore_volumes))
+    metrics.count(pores=int(pore_stats.total_pores.sum()))
+    # the best fit of every system of the batch is selected in one call
+    best_fit, r_squared = best_fit_distribution(pore_stats.diameters, pore_stats.offsets, BEST_FIT_DISTRIBUTIONS)
+    r_squared = {name: np.round(values, 4) for name, values in r_squared.items()}
+
+    for n, system in enumerate(systems):
+        props = PropertyIndex.of(system)
+        for prop in props:
+            if prop.name == 'pore volume':
+
+                i = fit_index[n]
+                props.append(Property(name='r_squared_norm', scalars=float(r_squared['norm'][i])))
+                props.append(Property(name='r_squared_lognorm', scalars=float(r_squared['lognorm'][i])))
+                props.append(Property(name='r_squared_weibull', scalars=float(r_squared['weibull'][i])))
+                props.append(Property(name='r_squared_gumbel', scalars=float(r_squared['gumbel'][i])))
+                # no distribution fits fewer than two pores
+                if best_fit[i] is not None:
+                    props.append(Property(name='dist_best_fit', scalars=best_fit[i].upper()))
+
+                if 'pore diameters' not in props:
+                    pore_diameters = pore_stats.diameters[pore_stats.offsets[i]:pore_stats.offsets[i + 1]]
+                    props.append(ArrayProperty(name='pore diameters', scalars=pore_diameters,
+                                                           units='$\mu m$'))
+
+                if 'stdev of pore diameters' not in props:
+                    stdev = Scalar(value=round(float(pore_stats.stdev_pore_diameter[i]), 3))
+                    props.append(Property(name='stdev of pore diameters', scalars=stdev, units='$\mu m$'))
+
+                if 'total pores' not in props:
+                    total_pores = Scalar(value=int(pore_stats.total_pores[i]))
+                    props.append(Property(name='total pores', scalars=total_pores))
+
+            if prop.name == 'max pore diameter':
+                mpd = float(prop.scalars.value)
+                if mpd > 200:
+                    props.append(Property(name='Pore size warning', scalars='RED'))
+                else:
+                    props.append(Property(name='Pore size warning', scalars='GREEN'))
+
+                if mpd > 200:
+                    props.append(Property(name='Pore size warning (ternary)', scalars='RED'))
+                elif 75 < mpd < 200:
+                    props.append(Property(name='Pore size warning (ternary)', scalars='YELLOW'))
+                else:
+                    props.append(Property(name='Pore size warning (ternary)', scalars='GREEN'))
+
+                props.append(Property(name="log max pore diameter", scalars=Scalar(value=math.log10(mpd))))
+
+            if prop.name == 'median pore diameter':
+                if prop.scalars.value > 22:
+                    props.append(Property(name='Median pore classifier', scalars='>22 um'))
+                else:
+                    props.append(Property(name='Median pore classifier', scalars='<22 um'))
 
     return systems
 
 
-def refine_to_relevant_props(develop_branch_dir, feature_branch_dir):
+register_stage('identifiers', lambda system, context: add_identifiers_to_system(system, context['file']))
+register_stage('heat treatment', lambda system, context: add_heat_treatment_to_system(system, context['file']))
+register_stage('porosity data',
+               lambda system, context: add_porosity_data_to_system(system, context['porosity_index']))
+# the statistics are vectorized across systems, so they run on whole batches
+register_stage('porosity stats', lambda systems, context: add_porosity_stats_to_pifs(systems), batch=True)
+register_stage('pore diameter buckets', lambda systems, context: add_pore_diameter_bucket_prop(systems), batch=True)
+register_stage('unverified pore data', lambda system, context: remove_unverified_pore_data_from_system(system))
+
+# merging master pifs with the porosity pifs, and computing statistics of
+# the merged pore data; modify_master_dataset runs both in one pass
+MERGE_STAGES = ['identifiers', 'heat treatment', 'porosity data']
+STATS_STAGES = ['porosity stats', 'pore diameter buckets', 'unverified pore data']
+MASTER_STAGES = MERGE_STAGES + STATS_STAGES
+
+
+def refine_to_relevant_props(develop_branch_dir, feature_branch_dir, incremental=False, cache_dir=None):
+
+    """
+    Writes the porosity and mechanical properties of every develop branch
+    pif to the feature branch. If cache_dir is given, the develop pifs are
+    read through a binary DatasetCache kept there.
+    """
 
     porosity_props = ['max pore diameter', 'mean pore diameter', 'fraction porosity', 'median pore spacing',
                            'median pore diameter', 'log max pore diameter', 'Pore size warning',
@@ -267,52 +623,89 @@ def refine_to_relevant_props(develop_branch_dir, feature_branch_dir):
     mechanical_props = ['elastic modulus', 'elastic onset', 'yield strength', 'yield strain', 'ultimate strength',
                         'necking onset', 'fracture strength', 'total elongation', 'ductility', 'toughness']
 
-    selected_prop_names = porosity_props + mechanical_props
+    selected_prop_names = set(porosity_props + mechanical_props)
+    if incremental:
+        manifest = Manifest(feature_branch_dir)
+        params = dict(pipeline=PIPELINE_VERSION, props=porosity_props + mechanical_props)
+    cache = None if cache_dir is None else DatasetCache.build(develop_branch_dir, cache_dir)
 
-    for f in os.listdir(develop_branch_dir):
+    for f in sorted(os.listdir(develop_branch_dir)):
 
         if ".json" in f:
 
-            new_systems = []
-
             infile_path = develop_branch_dir + f
-            old_systems = pif.load(open(infile_path, 'r'))
-            print(infile_path, len(old_systems))
-            for old_system in old_systems:
-                new_system = ChemicalSystem()
-                new_system.names = old_system.names
-                new_system.references = old_system.references
-                new_system.ids = old_system.ids
-                new_system.preparation = old_system.preparation
-                # new_system.sub_systems = old_system.sub_systems
-                new_system.properties = []
-                if old_system.properties:
-                    for prop in old_system.properties:
-                        if prop.name in selected_prop_names:
-                            new_system.properties.append(prop)
-
-                # mechanical props stored in subsystem
-                if old_system.sub_systems:
-                    for sub_system in old_system.sub_systems:
-                        if sub_system.properties:
-                            for prop in sub_system.properties:
-                                if prop.name in selected_prop_names:
-                                    new_system.properties.append(prop)
-
-                new_systems.append(new_system)
-
             outfile_path = feature_branch_dir+f.replace(".json", "_refined.json")
-            pif.dump(new_systems, open(outfile_path, 'w'))
+            if incremental and manifest.is_current(outfile_path, [infile_path], **params):
+                print("UP TO DATE: ", outfile_path)
+                continue
 
+            count = 0
+            with metrics.stage('refine', file=f) as record:
+                with pif_io.open_output(outfile_path) as outfile, pif_io.PifWriter(outfile) as writer:
+                    # only the selected properties are decoded
+                    for old_system in read_systems(infile_path, properties=selected_prop_names, cache=cache):
+                        count += 1
+                        writer.write(refine_system(old_system, selected_prop_names))
+                record.read(infile_path)
+                record.wrote(outfile_path)
+                record.add(systems=count)
+            print(infile_path, count)
 
+            if incremental:
+                manifest.record(outfile_path, [infile_path], **params)
+                manifest.save()
 
-def upload_pifs(base_input_dir, dataset_id):
 
-    for f in os.listdir(base_input_dir):
-        if ".json" in f:
-            print("UPLOADING: ", base_input_dir+f)
-            result = client.data.upload(dataset_id, base_input_dir+f, dest_path=f)
-            print(result.__dict__)
+def read_systems(infile_path, properties=None, cache=None):
+
+    """
+    Yields the systems of a pif file, keeping only the named properties if
+    properties is given, from the DatasetCache cache if one is given.
+    """
+    if cache is not None:
+        for system in cache.load(os.path.basename(infile_path), properties=properties):
+            yield system
+    else:
+        with open(infile_path, 'r') as infile:
+            for system in pif_io.iterload(infile, properties=properties):
+                yield system
+
+
+def refine_system(old_system, selected_prop_names):
+
+    new_system = ChemicalSystem()
+    new_system.names = old_system.names
+    new_system.references = old_system.references
+    new_system.ids = old_system.ids
+    new_system.preparation = old_system.preparation
+    # new_system.sub_systems = old_system.sub_systems
+    new_system.properties = []
+    props = PropertyIndex.of(new_system)
+    for prop in PropertyIndex.of(old_system):
+        if prop.name in selected_prop_names:
+            props.append(prop)
+
+    # mechanical props stored in subsystem
+    if old_system.sub_systems:
+        for sub_system in old_system.sub_systems:
+            for prop in PropertyIndex.of(sub_system):
+                if prop.name in selected_prop_names:
+                    props.append(prop)
+
+    return new_system
+
+
+def upload_pifs(base_input_dir, dataset_id, jobs=4, attempts=5, data_client=None):
+
+    """
+    Uploads the pifs of a directory to a dataset, jobs at a time, retrying
+    each up to attempts times. Pifs already uploaded unchanged are skipped,
+    so an interrupted upload can be resumed by running it again.
+    :return: list of (file name, exception) of the files that failed
+    """
+    if data_client is None:
+        data_client = citrination_data_client()
+    return upload_directory(data_client, dataset_id, base_input_dir, jobs=jobs, attempts=attempts)
 
 
 def remove_outliers(base_input_dir):
@@ -322,18 +715,20 @@ def remove_outliers(base_input_dir):
         if "_refined.json" in f:
             print(f)
             infile_path = base_input_dir+f
-            systems = pif.load(open(infile_path, 'r'))
-
-            for system in systems:
-                for prop in system.properties:
-                    if prop.name == 'max pore diameter':
-                        mpd = float(prop.scalars.value)
-                        if mpd > 120:
-                            print(pif.dumps(prop))
-                            prop.scalars = ""
-
             outfile_path = infile_path.replace(".json", "_no_outliers.json")
-            pif.dump(systems, open(outfile_path, 'w'))
+            with metrics.stage('remove outliers', file=f) as record:
+                with open(infile_path, 'r') as infile, pif_io.open_output(outfile_path) as outfile, \
+                        pif_io.PifWriter(outfile) as writer:
+                    for system in pif_io.iterload(infile, large_arrays='defer'):
+                        for prop in PropertyIndex.of(system).get_all('max pore diameter'):
+                            mpd = float(prop.scalars.value)
+                            if mpd > 120:
+                                print(pif_io.dumps(prop))
+                                prop.scalars = ""
+                        writer.write(system)
+                record.read(infile_path)
+                record.wrote(outfile_path)
+                record.add(systems=writer.count)
 
 
 # refines unlabeled records in design space to just records from P005_B002
@@ -343,20 +738,23 @@ def refine_design_space(input_dir, output_dir):
 
         if ".json" in f:
             infile_path = input_dir + f
-            systems = pif.load(open(infile_path, 'r'))
-            print(f, len(systems))
-
-            refined_systems = []
-
-            for system in systems:
-                if not system.properties and "P005_B002" not in f:
-                    pass
-                else:
-                    refined_systems.append(system)
-
-            print(f, len(refined_systems))
             outfile_path = output_dir + f
-            pif.dump(refined_systems, open(outfile_path, 'w'))
+            count = 0
+            with metrics.stage('refine design space', file=f) as record:
+                with open(infile_path, 'r') as infile, pif_io.open_output(outfile_path) as outfile, \
+                        pif_io.PifWriter(outfile) as writer:
+                    for system in pif_io.iterload(infile, large_arrays='defer'):
+                        count += 1
+                        if not system.properties and "P005_B002" not in f:
+                            pass
+                        else:
+                            writer.write(system)
+                record.read(infile_path)
+                record.wrote(outfile_path)
+                record.add(systems=count)
+
+            print(f, count)
+            print(f, writer.count)
 
 
 def refine_by_id(input_dir, output_dir):
@@ -370,34 +768,54 @@ def refine_by_id(input_dir, output_dir):
 
         if ".json" in f:
             infile_path = input_dir + f
-            systems = pif.load(open(infile_path, 'r'))
-            print(f, len(systems))
-
-            refined_systems = []
-
-            for system in systems:
-                if system.ids[0].value in ids:
-                    system.properties = []
-                refined_systems.append(system)
-
-            print(f, len(refined_systems))
             outfile_path = output_dir + f
-            pif.dump(refined_systems, open(outfile_path, 'w'))
+            with metrics.stage('refine by id', file=f) as record:
+                with open(infile_path, 'r') as infile, pif_io.open_output(outfile_path) as outfile, \
+                        pif_io.PifWriter(outfile) as writer:
+                    for system in pif_io.iterload(infile, large_arrays='defer'):
+                        if system.ids[0].value in ids:
+                            system.properties = []
+                        writer.write(system)
+                record.read(infile_path)
+                record.wrote(outfile_path)
+                record.add(systems=writer.count)
+
+            print(f, writer.count)
 
 
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description="Update the IN718 pifs with porosity data.")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="number of worker processes used to parse the pore csvs (0 for all cores)")
+    parser.add_argument('--transfer-jobs', type=int, default=4,
+                        help="number of concurrent downloads/uploads")
+    parser.add_argument('--retries', type=int, default=5,
+                        help="attempts per downloaded/uploaded file")
+    parser.add_argument('--mirror', default=None,
+                        help="directory of a local mirror that downloads are synced into and linked from")
+    parser.add_argument('--offline', action='store_true',
+                        help="use the local mirror as is, without contacting the server")
+    parser.add_argument('--metrics', default=None, metavar='FILE',
+                        help="write per-stage metrics as JSON lines to FILE ('-' for stdout)")
+    parser.add_argument('--metrics-summary', action='store_true',
+                        help="print a per-stage summary of the metrics at the end")
+    parser.add_argument('--profile', default=None, metavar='FILE',
+                        help="write cProfile statistics of the run to FILE")
+    args = parser.parse_args()
+    if args.metrics or args.metrics_summary or args.profile:
+        metrics.enable(jsonl=args.metrics, summary=args.metrics_summary, profile=args.profile)
+
     base_download_path = "/Users/cborg/Box Sync/Mines Open Lead [MOL]/projects/NAVSEA/IN718/"
-    client = CitrinationClient(os.environ['CITRINATION_ADAPT_API_KEY'], 'https://adapt.citrination.com')
 
     # get input csv files from a data branch
-    # get_files_from_dataset(dataset_id='74', download_path=base_download_path+"data/porosity_csvs/")
+    # get_files_from_dataset(dataset_id='74', download_path=base_download_path+"data/porosity_csvs/", jobs=args.transfer_jobs, attempts=args.retries, mirror_dir=args.mirror, offline=args.offline)
 
     # since there is no outfacing ingester, ingest csvs files
-    # parse_csv(csv_file_dir=base_download_path+"data/porosity_csvs/", pif_dir=base_download_path+"data/porosity_jsons/")
+    # parse_csv(csv_file_dir=base_download_path+"data/porosity_csvs/", pif_dir=base_download_path+"data/porosity_jsons/", jobs=args.jobs)
 
     # get pif files from master branch
-    # get_files_from_dataset(dataset_id="73", download_path=base_download_path+"master/LPBF_Inconel_718/")
+    # get_files_from_dataset(dataset_id="73", download_path=base_download_path+"master/LPBF_Inconel_718/", jobs=args.transfer_jobs, attempts=args.retries, mirror_dir=args.mirror, offline=args.offline)
 
     # modify master branch, pushes modified dataset to a develop branch
     # modify_master_dataset(master_branch_dir=base_download_path+"master/LPBF_Inconel_718/", develop_branch_dir=base_download_path+"develop/LPBF_Inconel_718/")
@@ -405,10 +823,12 @@ if __name__ == "__main__":
     refine_to_relevant_props(develop_branch_dir=base_download_path+"develop/LPBF_Inconel_718/", feature_branch_dir=base_download_path+"feature/IN718_refined_with_mech_props/")
 
     # upload to new dataset
-    # upload_pifs(base_download_path+"develop/LPBF_Inconel_718/", 78)
+    # upload_pifs(base_download_path+"develop/LPBF_Inconel_718/", 78, jobs=args.transfer_jobs, attempts=args.retries)
 
     # remove_outliers(base_input_dir=base_download_path+"73/")
     # pif_check(base_download_path+"feature/IN718_refined/", base_download_path+"feature/ml_ready/")
 
     # refine_design_space(input_dir=base_download_path+"feature/IN718_refined/", output_dir=base_download_path+"feature/IN718_refined_design/")
-    # refine_by_id(input_dir=base_download_path+"feature/IN718_refined_design/", output_dir=base_download_path+"feature/IN718_refined_design_week1/")
\ No newline at end of file
+    # refine_by_id(input_dir=base_download_path+"feature/IN718_refined_design/", output_dir=base_download_path+"feature/IN718_refined_design_week1/")
+
+    metrics.disable()
@@ -0,0 +1,439 @@
+"""
+Throughput and memory benchmarks of the porosity pipeline.
+
+    python -m benchmarks.run --pores 1e3 1e5 1e7 --samples 10 1000 --output results/v1.json
+    python -m benchmarks.run --only 'pore_statistics.*' --compare results/v1.json
+
+There are two kinds of cases:
+
+* ``pores`` cases time a ``pore_statistics`` function or class on a single
+  synthetic scan of each ``--pores`` size (functions of many samples get
+  the scan split into samples of SAMPLE_SIZE pores);
+* ``dataset`` cases time ``parse_csv``, ``modify_master_dataset`` and
+  ``refine_to_relevant_props`` on a synthetic dataset of each ``--samples``
+  size, with ``--pores-per-sample`` pores per sample.
+
+Every case runs in a fresh process, so its peak resident set size is its
+own. Each result records the wall and CPU time of every repetition, the
+throughput in pores per second (of the fastest repetition) and the peak
+RSS, and is written to a JSON file together with the commit and the
+platform it was measured on. ``--compare`` reports the change from an
+earlier results file and exits with status 1 if any case got slower, or
+needed more memory, by more than ``--threshold``.
+
+The synthetic datasets (see :mod:`benchmarks.synthetic`) are generated
+once into ``--work-dir`` and reused by later runs.
+"""
+import argparse
+import contextlib
+import datetime
+import fnmatch
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from IN718_porosity_updater.metrics import peak_rss_mb
+from benchmarks import synthetic
+
+
+RESULTS_VERSION = 1
+
+# Pores per sample when a scan is split for the functions of many samples
+SAMPLE_SIZE = 1000
+
+# Cluster distance, pair correlation cutoff and Ripley radii, in um
+CLUSTER_DISTANCE = 100
+PAIR_CUTOFF = 100
+RIPLEY_RADII = np.linspace(10, 100, 10)
+
+CASES = OrderedDict()
+
+
+class Case(object):
+    """
+    A benchmark.
+
+    :param name: Name the case is registered under.
+    :param kind: 'pores' or 'dataset': the inputs func is called with (a
+        :class:`PoreScan` or a :class:`Dataset`).
+    :param func: ``func(inputs)``; the call is what is timed.
+    :param setup: ``setup(inputs)``, called before every repetition and not
+        timed (e.g. to empty an output directory).
+    """
+
+    def __init__(self, name, kind, func, setup=None):
+        self.name = name
+        self.kind = kind
+        self.func = func
+        self.setup = setup
+
+
+def register_case(name, kind, func, setup=None):
+    """
+    Registers a benchmark case.
+
+    :param name: Case name.
+    :param kind: 'pores' or 'dataset'.
+    :param func: See :class:`Case`.
+    :param setup: See :class:`Case`.
+    :return: The Case.
+    """
+    CASES[name] = Case(name, kind, func, setup)
+    return CASES[name]
+
+
+class PoreScan(object):
+    """
+    Columns of a synthetic scan, as the pore statistics take them.
+
+    :param n_pores: Number of pores.
+    :param seed: Random seed.
+    """
+
+    def __init__(self, n_pores, seed=0):
+        from IN718_porosity_updater.ingest import CENTER_OF_MASS, MAX_LOCATION, MIN_LOCATION, VOLUME
+        from IN718_porosity_updater.pore_statistics import sphere_equivalent_diameter
+        columns = synthetic.pore_columns(n_pores, seed=seed)
+        self.n_pores = n_pores
+        self.volume = columns[VOLUME]
+        self.centers = tuple(columns[name] for name in CENTER_OF_MASS)
+        self.bounds = (tuple(columns[name].min() for name in MIN_LOCATION),
+                       tuple(columns[name].max() for name in MAX_LOCATION))
+        self.diameters = sphere_equivalent_diameter(self.volume)
+        self.offsets = np.append(np.arange(0, n_pores, SAMPLE_SIZE), n_pores)
+        self.samples = [self.volume[start:stop] for start, stop in zip(self.offsets[:-1], self.offsets[1:])]
+
+
+class Dataset(object):
+    """
+    Directories of a synthetic dataset, generated (once) by :meth:`prepare`.
+
+    :param work_dir: Directory the datasets are kept in.
+    :param n_samples: Number of samples.
+    :param n_pores: Pores per sample.
+    :param seed: Random seed.
+    """
+
+    def __init__(self, work_dir, n_samples, n_pores, seed=0):
+        self.n_samples = n_samples
+        self.n_pores = n_pores
+        self.root = os.path.join(work_dir, 'dataset-{}x{}-seed{}'.format(n_samples, n_pores, seed))
+        self.seed = seed
+        # the pipeline functions append file names to directory paths
+        self.csv_dir, self.porosity_dir, self.master_dir, self.develop_dir, self.out_dir = (
+            os.path.join(self.root, name, '') for name in ('csvs', 'porosity', 'master', 'develop', 'out'))
+
+    def prepare(self):
+        """
+        Generates the csvs and master pifs, and runs the pipeline once to get
+        the porosity and develop pifs the later stages start from.
+        """
+        from IN718_porosity_updater.update_pifs_with_porosity_data import modify_master_dataset, parse_csv
+        complete = os.path.join(self.root, '.complete')
+        if os.path.exists(complete):
+            return
+        shutil.rmtree(self.root, ignore_errors=True)
+        for path in (self.csv_dir, self.porosity_dir, self.master_dir, self.develop_dir, self.out_dir):
+            os.makedirs(path)
+        print("Generating {} samples of {} pores in {}...".format(self.n_samples, self.n_pores, self.root))
+        synthetic.write_pore_csvs(self.csv_dir, self.n_samples, self.n_pores, seed=self.seed)
+        synthetic.write_master_pifs(self.master_dir, self.n_samples, seed=self.seed)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            failures = parse_csv(self.csv_dir, self.porosity_dir)
+            modify_master_dataset(self.master_dir, self.develop_dir, porosity_json_dir=self.porosity_dir)
+        if failures:
+            raise RuntimeError("parsing the synthetic csvs failed: {}".format(failures))
+        open(complete, 'w').close()
+
+    def clear_output(self):
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+        os.makedirs(self.out_dir)
+
+
+def _pore_statistics(name):
+    from IN718_porosity_updater import pore_statistics
+    return getattr(pore_statistics, name)
+
+
+def _all_pore_statistics(scan):
+    # everything parse_pore_csv computes for a sample
+    from IN718_porosity_updater.pore_statistics import PoreStatistics
+    pore_stats = PoreStatistics(scan.volume, *scan.centers, bounds=scan.bounds)
+    for name in ('neighbor_distances', 'median_pore_diameter', 'mean_pore_diameter', 'max_pore_diameter',
+                 'stdev_pore_diameter', 'median_pore_spacing', 'mean_pore_spacing', 'total_pores',
+                 'total_pore_volume'):
+        getattr(pore_stats, name)
+    pore_stats.diameter_histogram()
+    pore_stats.clusters(CLUSTER_DISTANCE)
+
+
+def _all_ragged_pore_statistics(scan):
+    # everything add_porosity_stats_to_pifs computes, for samples of SAMPLE_SIZE pores
+    from IN718_porosity_updater.pore_statistics import RaggedPoreStatistics
+    pore_stats = RaggedPoreStatistics(scan.volume, scan.offsets, *scan.centers)
+    for name in ('neighbor_distances', 'median_pore_diameter', 'mean_pore_diameter', 'max_pore_diameter',
+                 'stdev_pore_diameter', 'median_pore_spacing', 'mean_pore_spacing', 'total_pores',
+                 'total_pore_volume'):
+        getattr(pore_stats, name)
+    pore_stats.probability_plot_r()
+    pore_stats.diameter_histogram()
+
+
+def _streamed_pore_statistics(scan, chunksize=100000):
+    from IN718_porosity_updater.pore_statistics import StreamingPoreStatistics
+    pore_stats = StreamingPoreStatistics()
+    for start in range(0, scan.n_pores, chunksize):
+        pore_stats.update(scan.volume[start:start + chunksize])
+    return pore_stats.median_pore_diameter, pore_stats.stdev_pore_diameter
+
+
+def _quantile_sketch(scan, chunksize=100000):
+    from IN718_porosity_updater.pore_statistics import QuantileSketch
+    sketch = QuantileSketch()
+    for start in range(0, scan.n_pores, chunksize):
+        sketch.update(scan.diameters[start:start + chunksize])
+    return sketch.quantile(0.5)
+
+
+def _pipeline(name):
+    from IN718_porosity_updater import update_pifs_with_porosity_data
+    return getattr(update_pifs_with_porosity_data, name)
+
+
+for _name, _func in [
+        ('sphere_equivalent_diameter', lambda s: _pore_statistics('sphere_equivalent_diameter')(s.volume)),
+        ('median_pore_diameter', lambda s: _pore_statistics('median_pore_diameter')(s.volume)),
+        ('max_pore_diameter', lambda s: _pore_statistics('max_pore_diameter')(s.volume)),
+        ('diameter_histogram', lambda s: _pore_statistics('diameter_histogram')(s.diameters)),
+        ('nearest_neighbor_distance', lambda s: _pore_statistics('nearest_neighbor_distance')(*s.centers)),
+        ('median_pore_spacing', lambda s: _pore_statistics('median_pore_spacing')(*s.centers)),
+        ('mean_pore_spacing', lambda s: _pore_statistics('mean_pore_spacing')(*s.centers)),
+        ('pair_correlation', lambda s: _pore_statistics('pair_correlation')(
+            *s.centers, cutoff=PAIR_CUTOFF, bounds=s.bounds)),
+        ('ripley_k', lambda s: _pore_statistics('ripley_k')(*s.centers, radii=RIPLEY_RADII, bounds=s.bounds)),
+        ('pore_clusters', lambda s: _pore_statistics('pore_clusters')(*s.centers, distance=CLUSTER_DISTANCE)),
+        ('qq_normal', lambda s: _pore_statistics('qq_normal')(s.diameters)),
+        ('qq_lognormal', lambda s: _pore_statistics('qq_lognormal')(s.diameters)),
+        ('probability_plot_r', lambda s: _pore_statistics('probability_plot_r')(s.diameters, s.offsets)),
+        ('best_fit_distribution', lambda s: _pore_statistics('best_fit_distribution')(s.diameters, s.offsets)),
+        ('concatenate_samples', lambda s: _pore_statistics('concatenate_samples')(s.samples)),
+        ('PoreStatistics', _all_pore_statistics),
+        ('RaggedPoreStatistics', _all_ragged_pore_statistics),
+        ('StreamingPoreStatistics', _streamed_pore_statistics),
+        ('QuantileSketch', _quantile_sketch)]:
+    register_case('pore_statistics.' + _name, 'pores', _func)
+
+register_case('parse_csv', 'dataset',
+              lambda d: _pipeline('parse_csv')(d.csv_dir, d.out_dir, use_cache=False),
+              setup=Dataset.clear_output)
+register_case('parse_csv[sidecar]', 'dataset',
+              lambda d: _pipeline('parse_csv')(d.csv_dir, d.out_dir, use_cache=True),
+              setup=Dataset.clear_output)
+register_case('parse_csv[streamed]', 'dataset',
+              lambda d: _pipeline('parse_csv')(d.csv_dir, d.out_dir, chunksize=100000, use_cache=False),
+              setup=Dataset.clear_output)
+register_case('modify_master_dataset', 'dataset',
+              lambda d: _pipeline('modify_master_dataset')(d.master_dir, d.out_dir, porosity_json_dir=d.porosity_dir),
+              setup=Dataset.clear_output)
+register_case('refine_to_relevant_props', 'dataset',
+              lambda d: _pipeline('refine_to_relevant_props')(d.develop_dir, d.out_dir),
+              setup=Dataset.clear_output)
+
+
+def run_case(name, params, repeat=3):
+    """
+    Runs a case; meant to be called in a process of its own.
+
+    :param name: Case name.
+    :param params: ``n_pores`` for a pores case; ``work_dir``,
+        ``n_samples``, ``n_pores`` and ``seed`` for a dataset case.
+    :param repeat: Number of timed repetitions.
+    :return: dict of the measurements.
+    """
+    case = CASES[name]
+    if case.kind == 'pores':
+        inputs = PoreScan(params['n_pores'], seed=params.get('seed', 0))
+        pores = params['n_pores']
+    else:
+        inputs = Dataset(params['work_dir'], params['n_samples'], params['n_pores'], seed=params.get('seed', 0))
+        pores = params['n_samples'] * params['n_pores']
+    wall, cpu = [], []
+    rss_before = peak_rss_mb()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            if case.setup is not None:
+                case.setup(inputs)
+            start_wall, start_cpu = time.perf_counter(), time.process_time()
+            case.func(inputs)
+            wall.append(time.perf_counter() - start_wall)
+            cpu.append(time.process_time() - start_cpu)
+    peak = peak_rss_mb()
+    return OrderedDict([('wall_s', wall), ('cpu_s', cpu), ('pores_per_s', pores / min(wall) if min(wall) else None),
+                        ('peak_rss_mb', round(peak, 1)), ('peak_rss_increase_mb', round(peak - rss_before, 1))])
+
+
+def _in_fresh_process(func, *args):
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(func, *args).result()
+
+
+def _prepare(work_dir, n_samples, n_pores, seed):
+    Dataset(work_dir, n_samples, n_pores, seed=seed).prepare()
+
+
+def measure(name, params, repeat=3):
+    """
+    Runs a case in a fresh process.
+
+    :param name: Case name.
+    :param params: See :func:`run_case`.
+    :param repeat: Number of timed repetitions.
+    :return: dict of the case name, its parameters and the measurements.
+    """
+    measurements = _in_fresh_process(run_case, name, params, repeat)
+    result = OrderedDict([('name', name), ('params', {k: v for k, v in params.items() if k != 'work_dir'})])
+    result.update(measurements)
+    return result
+
+
+def _case_key(result):
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Compares results with those of an earlier run.
+
+    :param results: List of results.
+    :param baseline: List of results of the earlier run.
+    :param threshold: Relative increase of the fastest wall time or of the
+        peak RSS increase that counts as a regression.
+    :return: List of (result, metric, old value, new value) of the
+        regressions.
+    """
+    old = {_case_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = old.get(_case_key(result))
+        if before is None:
+            continue
+        for metric, new_value, old_value in (('wall_s', min(result['wall_s']), min(before['wall_s'])),
+                                             ('peak_rss_increase_mb', result['peak_rss_increase_mb'],
+                                              before['peak_rss_increase_mb'])):
+            change = (new_value - old_value) / old_value if old_value else None
+            flag = ''
+            if change is not None and change > threshold:
+                flag = 'REGRESSION'
+                regressions.append((result, metric, old_value, new_value))
+            print("{:<48} {:<22} {:10.4g} -> {:10.4g} {:>7} {}".format(
+                _label(result), metric, old_value, new_value,
+                'n/a' if change is None else '{:+.1%}'.format(change), flag))
+    return regressions
+
+
+def _label(result):
+    return '{}[{}]'.format(result['name'], ','.join('{}={}'.format(k, v) for k, v in sorted(result['params'].items())))
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _count(value):
+    # accept 1e6 as well as 1000000
+    return int(float(value))
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--pores', type=_count, nargs='+', default=[1000, 10000, 100000],
+                        help="pores per scan of the pore_statistics cases (1e3 to 1e7)")
+    parser.add_argument('--samples', type=_count, nargs='+', default=[10, 100],
+                        help="samples per dataset of the pipeline cases (10 to 10000)")
+    parser.add_argument('--pores-per-sample', type=_count, default=1000,
+                        help="pores per sample of the datasets")
+    parser.add_argument('--only', nargs='+', default=['*'],
+                        help="run only the cases matching these shell patterns")
+    parser.add_argument('--repeat', type=int, default=3, help="timed repetitions per case")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic data")
+    parser.add_argument('--work-dir', default=os.path.join('benchmarks', 'work'),
+                        help="directory the synthetic datasets are kept in")
+    parser.add_argument('--output', default=None,
+                        help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument('--compare', default=None, help="earlier results file to compare with")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="relative slowdown or memory growth reported as a regression")
+    parser.add_argument('--list', action='store_true', help="list the cases and exit")
+    return parser.parse_args(args)
+
+
+def main(args):
+    """
+    Runs the benchmarks.
+
+    :param args: Command line arguments.
+    :return: Exit status: 1 if --compare found a regression.
+    """
+    args = parse_args(args)
+    names = [name for name in CASES if any(fnmatch.fnmatchcase(name, pattern) for pattern in args.only)]
+    if args.list:
+        for name in names:
+            print(name)
+        return 0
+
+    commit = _commit()
+    output = args.output or os.path.join('benchmarks', 'results', '{}.json'.format(commit))
+    results = []
+    for name in names:
+        if CASES[name].kind == 'pores':
+            runs = [dict(n_pores=n, seed=args.seed) for n in args.pores]
+        else:
+            runs = [dict(work_dir=args.work_dir, n_samples=n, n_pores=args.pores_per_sample, seed=args.seed)
+                    for n in args.samples]
+        for params in runs:
+            if CASES[name].kind == 'dataset':
+                # in a process of its own, so the benchmark driver stays small
+                _in_fresh_process(_prepare, args.work_dir, params['n_samples'], params['n_pores'], args.seed)
+            result = measure(name, params, repeat=args.repeat)
+            results.append(result)
+            print("BENCHMARK: {:<48} {:9.4f} s  {:10.4g} pores/s  {:8.1f} MiB".format(
+                _label(result), min(result['wall_s']), result['pores_per_s'] or 0, result['peak_rss_mb']))
+
+    if os.path.dirname(output) and not os.path.exists(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    with open(output, 'w') as fh:
+        json.dump(OrderedDict([
+            ('version', RESULTS_VERSION),
+            ('commit', commit),
+            ('date', datetime.datetime.now().isoformat(timespec='seconds')),
+            ('python', platform.python_version()),
+            ('platform', platform.platform()),
+            ('cpu_count', os.cpu_count()),
+            ('results', results)]), fh, indent=1)
+    print("RESULTS: ", output)
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as fh:
+            baseline = json.load(fh)['results']
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,188 @@
+"""
+Synthetic tracr pore scans and IN718 pif datasets for the benchmarks.
+
+Pores are placed uniformly in a cube whose side grows with the number of
+pores, so the pore density (and with it the cost per pore of the spatial
+statistics) stays the same at every scale; a fraction of the pores is
+placed next to another pore, so that the cluster statistics have clusters
+to find. Pore volumes are lognormal, close to those of the example scan.
+Everything is generated from a seed, so a scale is the same data on every
+run and every machine.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from pypif.obj import ChemicalSystem, Property, ProcessStep, Value
+
+from IN718_porosity_updater import pif_io
+from IN718_porosity_updater.ingest import CENTER_OF_MASS, MAX_LOCATION, MIN_LOCATION, VOLUME
+
+
+# Columns of a tracr pore export, in order
+TRACR_COLUMNS = (['Label', VOLUME, 'Surface Area (µm²)'] +
+                 ['Surface Area {} (µm²)'.format(axis) for axis in 'XYZ'] +
+                 ['Volume / Surface Area (µm)', 'Phi (°)', 'Theta (°)', 'Aspect Ratio'] +
+                 CENTER_OF_MASS + MIN_LOCATION + MAX_LOCATION)
+
+# Pores per cubic micron: about 600 pores in a 6 mm cube, as in the example scan
+PORE_DENSITY = 600 / 6000.0 ** 3
+
+# Share of the pores placed within a few diameters of another pore
+CLUSTERED_FRACTION = 0.1
+
+# Samples per master pif (one build plate)
+SAMPLES_PER_FILE = 100
+
+MECHANICAL_PROPERTIES = (('elastic modulus', 'GPa', 200), ('yield strength', 'MPa', 900),
+                         ('ultimate strength', 'MPa', 1200), ('total elongation', '%', 20))
+
+
+def _seed(seed, *keys):
+    # a seed of its own for each part of a dataset, derived from the dataset's
+    return [int(k) for k in np.atleast_1d(seed)] + list(keys)
+
+
+def cube_side(n_pores):
+    """
+    Side of the cube holding n_pores at PORE_DENSITY.
+
+    :param n_pores: Number of pores.
+    :return: Side length, in um.
+    """
+    return (n_pores / PORE_DENSITY) ** (1 / 3)
+
+
+def pore_columns(n_pores, seed=0, side=None):
+    """
+    Columns of a synthetic tracr pore export.
+
+    :param n_pores: Number of pores.
+    :param seed: Random seed.
+    :param side: Side of the cube the pores are placed in, in um
+        (``cube_side(n_pores)`` by default).
+    :return: dict mapping each of TRACR_COLUMNS to an array.
+    """
+    rng = np.random.RandomState(seed)
+    if side is None:
+        side = cube_side(n_pores)
+    volume = rng.lognormal(np.log(3000.0), 1.0, n_pores)
+    radius = (3 * volume / (4 * np.pi)) ** (1 / 3)
+    center = rng.uniform(-side / 2, side / 2, (n_pores, 3))
+    clustered = rng.rand(n_pores) < CLUSTERED_FRACTION
+    clustered[0] = False
+    # each clustered pore sits next to an earlier pore
+    anchors = (rng.rand(n_pores) * np.arange(n_pores)).astype(np.int64)
+    center[clustered] = center[anchors[clustered]] + rng.normal(0, 30.0, (int(clustered.sum()), 3))
+    area = 4 * np.pi * radius ** 2 * rng.uniform(1.0, 1.5, n_pores)
+    columns = {
+        'Label': np.arange(1, n_pores + 1),
+        VOLUME: volume,
+        'Surface Area (µm²)': area,
+        'Volume / Surface Area (µm)': volume / area,
+        'Phi (°)': rng.uniform(0, 180, n_pores),
+        'Theta (°)': rng.uniform(0, 180, n_pores),
+        'Aspect Ratio': rng.uniform(0.2, 1.0, n_pores),
+    }
+    for i, axis in enumerate('XYZ'):
+        columns['Surface Area {} (µm²)'.format(axis)] = area * rng.uniform(0.2, 0.5, n_pores)
+        columns[CENTER_OF_MASS[i]] = center[:, i]
+        columns[MIN_LOCATION[i]] = center[:, i] - radius
+        columns[MAX_LOCATION[i]] = center[:, i] + radius
+    return columns
+
+
+def write_pore_csv(path, n_pores, seed=0, chunk_size=1000000):
+    """
+    Writes a synthetic tracr pore export (UTF-16, like tracr's own). It is
+    generated and written chunk_size pores at a time, so large scans do not
+    have to fit in memory.
+
+    :param path: Path of the csv.
+    :param n_pores: Number of pores.
+    :param seed: Random seed.
+    :param chunk_size: Pores generated at a time.
+    :return: Total volume of the pores, in um^3.
+    """
+    total_volume = 0.0
+    with open(path, 'w', encoding='utf-16', newline='') as fh:
+        for n, start in enumerate(range(0, n_pores, chunk_size)):
+            size = min(chunk_size, n_pores - start)
+            # the chunks of a scan share its cube, but not their random numbers
+            columns = pore_columns(size, seed=_seed(seed, n), side=cube_side(n_pores))
+            columns['Label'] += start
+            total_volume += columns[VOLUME].sum()
+            pd.DataFrame(columns, columns=TRACR_COLUMNS).to_csv(fh, header=n == 0, index=False)
+    return total_volume
+
+
+def write_full_csv(path, n_pores):
+    """
+    Writes the _full.csv of a scan: the volume of the whole part.
+
+    :param path: Path of the csv.
+    :param n_pores: Number of pores of the scan.
+    """
+    side = cube_side(n_pores)
+    columns = {name: [0.0] for name in TRACR_COLUMNS}
+    columns['Label'] = [1]
+    columns[VOLUME] = [side ** 3]
+    with open(path, 'w', encoding='utf-16', newline='') as fh:
+        pd.DataFrame(columns, columns=TRACR_COLUMNS).to_csv(fh, index=False)
+
+
+def sample_ids(n_samples):
+    """
+    Sample ids of a synthetic dataset, SAMPLES_PER_FILE per build plate, in
+    the ``P001_B001_A01`` form that add_identifiers_to_system derives from
+    a master pif's file name and printing row and column.
+
+    :param n_samples: Number of samples.
+    :return: list of (master pif name, column, row, sample id)
+    """
+    ids = []
+    for n in range(n_samples):
+        plate, position = divmod(n, SAMPLES_PER_FILE)
+        column, row = 'ABCDEFGHIJ'[position // 10], position % 10 + 1
+        prefix = 'P{:03d}_B001'.format(plate + 1)
+        ids.append((prefix + '-nohough.json', column, row, '{}_{}{:02d}'.format(prefix, column, row)))
+    return ids
+
+
+def write_pore_csvs(csv_dir, n_samples, n_pores, seed=0):
+    """
+    Writes a pore csv and a _full.csv for every sample of a synthetic
+    dataset.
+
+    :param csv_dir: Directory to write to.
+    :param n_samples: Number of samples.
+    :param n_pores: Pores per sample.
+    :param seed: Random seed.
+    """
+    for n, (_, _, _, sample_id) in enumerate(sample_ids(n_samples)):
+        write_pore_csv(os.path.join(csv_dir, sample_id + '.csv'), n_pores, seed=_seed(seed, n))
+        write_full_csv(os.path.join(csv_dir, sample_id + '_full.csv'), n_pores)
+
+
+def write_master_pifs(master_dir, n_samples, seed=0):
+    """
+    Writes the master branch pifs of a synthetic dataset: one file per build
+    plate, each system with its printing row and column and mechanical
+    properties.
+
+    :param master_dir: Directory to write to.
+    :param n_samples: Number of samples.
+    :param seed: Random seed.
+    """
+    rng = np.random.RandomState(seed)
+    files = {}
+    for f, column, row, _ in sample_ids(n_samples):
+        properties = [Property(name=name, scalars=round(float(rng.normal(mean, mean / 20)), 2), units=units)
+                      for name, units, mean in MECHANICAL_PROPERTIES]
+        printing = ProcessStep(name='printing', details=[Value(name='row', scalars=row),
+                                                         Value(name='column', scalars=column)])
+        files.setdefault(f, []).append(ChemicalSystem(names=['IN718'], preparation=[printing],
+                                                      properties=properties))
+    for f, systems in files.items():
+        with open(os.path.join(master_dir, f), 'w') as fh:
+            pif_io.dump(systems, fh)
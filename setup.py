@@ -17,6 +17,7 @@ entry_points = """
 # script_name = piftk.module:function
 # For example:
 # fibonacci = piftk.skeleton:run
+piftk = piftk.cli:run
 """
 
 
@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
-from pkg_resources import get_distribution, DistributionNotFound
 
-try:
-    # Change here if project is renamed and does not equal the package name
-    dist_name = __name__
-    __version__ = get_distribution(dist_name).version
-except DistributionNotFound:
-    __version__ = 'unknown'
+
+def __getattr__(name):
+    # The version is looked up on first use: importing the package metadata
+    # machinery takes longer than the rest of the command-line startup.
+    if name == '__version__':
+        from importlib.metadata import version, PackageNotFoundError
+        try:
+            # Change here if project is renamed and does not equal the package name
+            dist_name = __name__
+            return version(dist_name)
+        except PackageNotFoundError:
+            return 'unknown'
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+The ``piftk`` console script: one subcommand per stage of updating the
+IN718 pifs with porosity data.
+
+    piftk download 74 data/porosity_csvs
+    piftk ingest data/porosity_csvs data/porosity_jsons -j 0
+    piftk merge master data/porosity_jsons develop --stats
+    piftk refine develop feature/refined
+    piftk filter outliers feature/refined
+    piftk upload develop 78
+
+Only the standard library is imported at startup. Each subcommand imports
+what it needs when it runs, so ``--help`` (and the transfers, which do not
+need pandas, scipy or pypif) start quickly.
+"""
+from __future__ import division, print_function, absolute_import
+
+import argparse
+import os
+import sys
+import logging
+
+import piftk
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+_logger = logging.getLogger(__name__)
+
+
+class _VersionAction(argparse.Action):
+    # like action='version', but only looks the version up when asked for it
+
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, help=None):
+        super(_VersionAction, self).__init__(option_strings, dest, nargs=0, default=argparse.SUPPRESS, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        parser.exit(message='piftk {ver}\n'.format(ver=piftk.__version__))
+
+
+def _directory(path):
+    # the stages build paths by appending file names to directories
+    return os.path.join(path, '')
+
+
+def _output_directory(path):
+    path = _directory(path)
+    if not os.path.exists(path):
+        os.makedirs(path)
+    return path
+
+
+def _failed(failures):
+    return 1 if failures else 0
+
+
+def ingest(args):
+    """Parse tracr pore csvs into porosity pifs
+
+    Args:
+      args (:obj:`argparse.Namespace`): parsed ``ingest`` arguments
+
+    Returns:
+      int: exit status
+    """
+    from IN718_porosity_updater.update_pifs_with_porosity_data import parse_csv
+    return _failed(parse_csv(_directory(args.csv_dir), _output_directory(args.pif_dir),
+                             chunksize=args.chunksize, relative_accuracy=args.relative_accuracy,
+                             cluster_distance=args.cluster_distance, use_cache=args.use_cache,
+                             jobs=args.jobs, incremental=args.incremental))
+
+
+def merge(args):
+    """Add identifiers, heat treatment and porosity data to master pifs
+
+    Args:
+      args (:obj:`argparse.Namespace`): parsed ``merge`` arguments
+
+    Returns:
+      int: exit status
+    """
+    from IN718_porosity_updater.update_pifs_with_porosity_data import (
+        modify_master_dataset, MASTER_STAGES, MERGE_STAGES)
+    modify_master_dataset(_directory(args.master_dir), _output_directory(args.develop_dir),
+                          porosity_json_dir=_directory(args.porosity_dir), incremental=args.incremental,
+                          stages=MASTER_STAGES if args.stats else MERGE_STAGES, batch_size=args.batch_size)
+    return 0
+
+
+def stats(args):
+    """Compute the pore statistics of merged pifs
+
+    Args:
+      args (:obj:`argparse.Namespace`): parsed ``stats`` arguments
+
+    Returns:
+      int: exit status
+    """
+    from IN718_porosity_updater.update_pifs_with_porosity_data import modify_master_dataset, STATS_STAGES
+    modify_master_dataset(_directory(args.input_dir), _output_directory(args.output_dir),
+                          incremental=args.incremental, stages=STATS_STAGES, batch_size=args.batch_size)
+    return 0
+
+
+def refine(args):
+    """Keep only the properties used for machine learning
+
+    Args:
+      args (:obj:`argparse.Namespace`): parsed ``refine`` arguments
+
+    Returns:
+      int: exit status
+    """
+    from IN718_porosity_updater.update_pifs_with_porosity_data import refine_to_relevant_props
+    refine_to_relevant_props(_directory(args.develop_dir), _output_directory(args.feature_dir),
+                             incremental=args.incremental, cache_dir=args.cache_dir)
+    return 0
+
+
+def filter_pifs(args):
+    """Remove outliers, or restrict pifs to the design space or sample ids
+
+    Args:
+      args (:obj:`argparse.Namespace`): parsed ``filter`` arguments
+
+    Returns:
+      int: exit status
+    """
+    from IN718_porosity_updater import update_pifs_with_porosity_data as update
+    if args.filter == 'outliers':
+        update.remove_outliers(_directory(args.input_dir))
+        return 0
+    if args.output_dir is None:
+        raise SystemExit("piftk filter {}: an output directory is required".format(args.filter))
+    func = update.refine_design_space if args.filter == 'design-space' else update.refine_by_id
+    func(_directory(args.input_dir), _output_directory(args.output_dir))
+    return 0
+
+
+def download(args):
+    """Download the files of a dataset
+
+    Args:
+      args (:obj:`argparse.Namespace`): parsed ``download`` arguments
+
+    Returns:
+      int: exit status
+    """
+    from IN718_porosity_updater.transfer import citrination_data_client, download_dataset
+    destination = _output_directory(args.destination)
+    if args.mirror is None:
+        return _failed(download_dataset(citrination_data_client(), args.dataset_id, destination,
+                                        jobs=args.jobs, attempts=args.retries))
+    from IN718_porosity_updater.mirror import DatasetMirror
+    mirror = DatasetMirror(args.mirror)
+    failures = [] if args.offline else mirror.sync(citrination_data_client(), args.dataset_id,
+                                                   jobs=args.jobs, attempts=args.retries)
+    for path in mirror.checkout(args.dataset_id, destination):
+        print("CHECKED OUT: ", path)
+    return _failed(failures)
+
+
+def upload(args):
+    """Upload the pifs of a directory to a dataset
+
+    Args:
+      args (:obj:`argparse.Namespace`): parsed ``upload`` arguments
+
+    Returns:
+      int: exit status
+    """
+    from IN718_porosity_updater.transfer import citrination_data_client, upload_directory
+    return _failed(upload_directory(citrination_data_client(), args.dataset_id, args.directory,
+                                    jobs=args.jobs, attempts=args.retries))
+
+
+def _add_incremental(parser):
+    parser.add_argument(
+        '--incremental',
+        help="skip outputs whose inputs are unchanged since they were last built",
+        action='store_true')
+
+
+def _add_batch_size(parser):
+    parser.add_argument(
+        '--batch-size',
+        help="number of systems streamed through the stages at a time",
+        type=int,
+        default=256)
+
+
+def _add_transfer_options(parser):
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        help="number of concurrent transfers",
+        type=int,
+        default=4)
+    parser.add_argument(
+        '--retries',
+        help="attempts per file",
+        type=int,
+        default=5)
+
+
+def parse_args(args):
+    """Parse command line parameters
+
+    Args:
+      args ([str]): command line parameters as list of strings
+
+    Returns:
+      :obj:`argparse.Namespace`: command line parameters namespace
+    """
+    parser = argparse.ArgumentParser(
+        prog='piftk',
+        description="Update the IN718 pifs with porosity data, one stage at a time")
+    parser.add_argument(
+        '--version',
+        action=_VersionAction,
+        help="show program's version number and exit")
+    parser.add_argument(
+        '-v',
+        '--verbose',
+        dest="loglevel",
+        help="set loglevel to INFO",
+        action='store_const',
+        const=logging.INFO)
+    parser.add_argument(
+        '-vv',
+        '--very-verbose',
+        dest="loglevel",
+        help="set loglevel to DEBUG",
+        action='store_const',
+        const=logging.DEBUG)
+    parser.add_argument(
+        '--metrics',
+        help="write per-stage metrics as JSON lines to FILE ('-' for stdout)",
+        metavar="FILE")
+    parser.add_argument(
+        '--metrics-summary',
+        help="print a per-stage summary of the metrics at the end",
+        action='store_true')
+    parser.add_argument(
+        '--profile',
+        help="write cProfile statistics of the run to FILE",
+        metavar="FILE")
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+    subparsers.required = True
+
+    sub = subparsers.add_parser('download', help="download the files of a dataset")
+    sub.add_argument(dest='dataset_id', help="dataset to download")
+    sub.add_argument(dest='destination', help="directory to download to")
+    _add_transfer_options(sub)
+    sub.add_argument(
+        '--mirror',
+        help="directory of a local mirror that downloads are synced into and linked from")
+    sub.add_argument(
+        '--offline',
+        help="use the local mirror as is, without contacting the server",
+        action='store_true')
+    sub.set_defaults(func=download)
+
+    sub = subparsers.add_parser('ingest', help="parse tracr pore csvs into porosity pifs")
+    sub.add_argument(dest='csv_dir', help="directory of the pore csvs")
+    sub.add_argument(dest='pif_dir', help="directory to write the porosity pifs to")
+    sub.add_argument(
+        '-j',
+        '--jobs',
+        help="number of worker processes (0 for all cores)",
+        type=int,
+        default=1)
+    sub.add_argument(
+        '--chunksize',
+        help="stream each csv in chunks of this many rows, storing only summary statistics",
+        type=int)
+    sub.add_argument(
+        '--relative-accuracy',
+        help="relative accuracy of the streamed median",
+        type=float,
+        default=0.01)
+    sub.add_argument(
+        '--cluster-distance',
+        help="largest gap between the pores of a cluster, in um (default: 1.5 median pore diameters)",
+        type=float)
+    sub.add_argument(
+        '--no-cache',
+        dest='use_cache',
+        help="do not read or write the binary sidecars of the csvs",
+        action='store_false')
+    _add_incremental(sub)
+    sub.set_defaults(func=ingest)
+
+    sub = subparsers.add_parser('merge', help="add identifiers, heat treatment and porosity data to master pifs")
+    sub.add_argument(dest='master_dir', help="directory of the master branch pifs")
+    sub.add_argument(dest='porosity_dir', help="directory of the porosity pifs")
+    sub.add_argument(dest='develop_dir', help="directory to write the develop branch pifs to")
+    sub.add_argument(
+        '--stats',
+        help="also compute the pore statistics, in the same pass",
+        action='store_true')
+    _add_incremental(sub)
+    _add_batch_size(sub)
+    sub.set_defaults(func=merge)
+
+    sub = subparsers.add_parser('stats', help="compute the pore statistics of merged pifs")
+    sub.add_argument(dest='input_dir', help="directory of the merged pifs")
+    sub.add_argument(dest='output_dir', help="directory to write the pifs with statistics to")
+    _add_incremental(sub)
+    _add_batch_size(sub)
+    sub.set_defaults(func=stats)
+
+    sub = subparsers.add_parser('refine', help="keep only the properties used for machine learning")
+    sub.add_argument(dest='develop_dir', help="directory of the develop branch pifs")
+    sub.add_argument(dest='feature_dir', help="directory to write the refined pifs to")
+    sub.add_argument(
+        '--cache-dir',
+        help="read the develop pifs through a binary cache kept in this directory")
+    _add_incremental(sub)
+    sub.set_defaults(func=refine)
+
+    sub = subparsers.add_parser('filter', help="remove outliers, or restrict pifs to the design space or ids")
+    sub.add_argument(
+        dest='filter',
+        help="outliers (written next to the inputs), design-space or id",
+        choices=['outliers', 'design-space', 'id'])
+    sub.add_argument(dest='input_dir', help="directory of the pifs")
+    sub.add_argument(dest='output_dir', help="directory to write the filtered pifs to", nargs='?')
+    sub.set_defaults(func=filter_pifs)
+
+    sub = subparsers.add_parser('upload', help="upload the pifs of a directory to a dataset")
+    sub.add_argument(dest='directory', help="directory of the pifs")
+    sub.add_argument(dest='dataset_id', help="dataset to upload to")
+    _add_transfer_options(sub)
+    sub.set_defaults(func=upload)
+
+    return parser.parse_args(args)
+
+
+def setup_logging(loglevel):
+    """Setup basic logging
+
+    Args:
+      loglevel (int): minimum loglevel for emitting messages
+    """
+    logformat = "[%(asctime)s] %(levelname)s:%(name)s:%(message)s"
+    logging.basicConfig(level=loglevel, stream=sys.stdout,
+                        format=logformat, datefmt="%Y-%m-%d %H:%M:%S")
+
+
+def main(args):
+    """Main entry point allowing external calls
+
+    Args:
+      args ([str]): command line parameter list
+
+    Returns:
+      int: exit status (1 if any file failed)
+    """
+    args = parse_args(args)
+    setup_logging(args.loglevel)
+    _logger.debug("Running %s", args.command)
+    if not (args.metrics or args.metrics_summary or args.profile):
+        return args.func(args)
+    from IN718_porosity_updater import metrics
+    metrics.enable(jsonl=args.metrics, summary=args.metrics_summary, profile=args.profile)
+    try:
+        return args.func(args)
+    finally:
+        metrics.disable()
+
+
+def run():
+    """Entry point for console_scripts
+    """
+    sys.exit(main(sys.argv[1:]))
+
+
+if __name__ == "__main__":
+    run()
@@ -1,12 +1,96 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-    Dummy conftest.py for piftk.
+    Fixtures shared by the tests.
 
-    If you don't know what this is for, just leave it empty.
     Read more about conftest.py under:
     https://pytest.org/latest/plugins.html
 """
 from __future__ import print_function, absolute_import, division
 
-# import pytest
+import hashlib
+import os
+import shutil
+import threading
+import pytest
+from IN718_porosity_updater import transfer
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+
+class DatasetFile(object):
+
+    def __init__(self, path, sha256=None):
+        self.path = path
+        self.sha256 = sha256
+
+
+class UploadResult(object):
+
+    def __init__(self, ok):
+        self.failures = {} if ok else {'file': 'rejected'}
+
+    def successful(self):
+        return not self.failures
+
+
+class LocalDataClient(object):
+    """
+    Stand-in for the Citrination data client that keeps datasets in local
+    directories under root, one per dataset id; files are downloaded from
+    the dataset_id directory. fail maps a file name to the number of calls
+    for it that fail before one succeeds. Files are listed with their
+    checksum if checksums is set.
+    """
+
+    def __init__(self, root, dataset_id=1, fail=None, checksums=True):
+        self.root = root
+        self.dataset_id = str(dataset_id)
+        self.fail = dict(fail or {})
+        self.checksums = checksums
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _maybe_fail(self, name):
+        with self.lock:
+            self.calls.append(name)
+            if self.fail.get(name, 0) > 0:
+                self.fail[name] -= 1
+                raise IOError('connection reset')
+
+    def get_dataset_files(self, dataset_id):
+        directory = os.path.join(self.root, str(dataset_id))
+        files = []
+        for f in sorted(os.listdir(directory)):
+            with open(os.path.join(directory, f), 'rb') as fh:
+                checksum = hashlib.sha256(fh.read()).hexdigest() if self.checksums else None
+            files.append(DatasetFile(f, checksum))
+        return files
+
+    def download_files(self, files, destination):
+        for dataset_file in files:
+            self._maybe_fail(dataset_file.path)
+            shutil.copy(os.path.join(self.root, self.dataset_id, dataset_file.path),
+                        os.path.join(destination, dataset_file.path))
+
+    def upload(self, dataset_id, source_path, dest_path=None):
+        self._maybe_fail(dest_path)
+        directory = os.path.join(self.root, str(dataset_id))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        shutil.copy(source_path, os.path.join(directory, dest_path))
+        return UploadResult(ok=dest_path != 'rejected.json')
+
+
+@pytest.fixture
+def local_data_client():
+    """Factory of LocalDataClient, taking the same arguments."""
+    return LocalDataClient
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    """Makes the retry backoff of transfer return immediately."""
+    monkeypatch.setattr(transfer.time, 'sleep', lambda seconds: None)
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from pypif import pif
+from pypif.obj import Property, Scalar
+from IN718_porosity_updater.array_property import ArrayProperty, scalar_values
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+
+def test_array_property_serializes_like_property():
+    values = np.array([1.5, 2.25, 3e-7])
+    expected = Property(name='pore volume', scalars=[Scalar(value=x) for x in values], units='um')
+    prop = ArrayProperty(name='pore volume', scalars=values, units='um')
+    assert pif.dumps(prop) == pif.dumps(expected)
+    assert [s.value for s in prop.scalars] == values.tolist()
+    assert np.shares_memory(prop.array, values)
+
+
+def test_array_property_accepts_plain_scalars():
+    prop = ArrayProperty(name='total pores')
+    prop.scalars = Scalar(value=3)
+    assert pif.dumps(prop) == pif.dumps(Property(name='total pores', scalars=Scalar(value=3)))
+
+
+def test_scalar_values_of_loaded_property():
+    text = pif.dumps(Property(name='x', scalars=[Scalar(value='1.5'), Scalar(value='2')]))
+    prop = pif.loads(text, class_=Property)
+    assert scalar_values(prop).tolist() == [1.5, 2.0]
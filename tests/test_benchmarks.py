@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import inspect
+import os
+from pypif import pif
+from IN718_porosity_updater import pore_statistics
+from IN718_porosity_updater.ingest import PORE_COLUMNS, VOLUME, read_pore_csv
+from benchmarks import run, synthetic
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+
+def test_every_pore_statistics_function_is_benchmarked():
+    public = [name for name, obj in vars(pore_statistics).items()
+              if not name.startswith('_') and (inspect.isfunction(obj) or inspect.isclass(obj)) and
+              obj.__module__ == pore_statistics.__name__]
+    assert sorted(name for name in public if 'pore_statistics.' + name not in run.CASES) == []
+
+
+def test_synthetic_csv_reads_like_a_tracr_export(tmpdir):
+    path = str(tmpdir.join('P001_B001_A01.csv'))
+    total_volume = synthetic.write_pore_csv(path, 2500, seed=1, chunk_size=1000)
+    columns = read_pore_csv(path, use_cache=False)
+    assert sorted(columns) == sorted(PORE_COLUMNS)
+    assert len(columns[VOLUME]) == 2500
+    assert abs(columns[VOLUME].sum() - total_volume) < 1e-6 * total_volume
+    # the chunks are spread over the cube of the whole scan
+    assert columns['Center Of Mass X (µm)'].max() > 0.4 * synthetic.cube_side(2500)
+
+
+def test_synthetic_dataset_runs_through_the_pipeline(tmpdir):
+    dataset = run.Dataset(str(tmpdir), 3, 200)
+    dataset.prepare()
+    with open(os.path.join(dataset.develop_dir, 'P001_B001-nohough.json')) as fh:
+        systems = pif.load(fh)
+    assert [s.ids[0].value for s in systems] == ['P001_B001_A01', 'P001_B001_A02', 'P001_B001_A03']
+    assert all('pore volume' in [p.name for p in s.properties] for s in systems)
+
+    params = dict(work_dir=str(tmpdir), n_samples=3, n_pores=200)
+    result = run.run_case('refine_to_relevant_props', params, repeat=2)
+    assert len(result['wall_s']) == len(result['cpu_s']) == 2
+    assert result['peak_rss_mb'] > 0
+    assert os.listdir(dataset.out_dir) == ['P001_B001-nohough_refined.json']
+
+
+def test_compare_flags_regressions():
+    def result(wall, rss):
+        return dict(name='case', params=dict(n_pores=10), wall_s=[wall], peak_rss_increase_mb=rss)
+    assert run.compare([result(1.0, 10.0)], [result(1.0, 10.0)]) == []
+    regressions = run.compare([result(1.5, 10.0)], [result(1.0, 10.0)], threshold=0.2)
+    assert [metric for _, metric, _, _ in regressions] == ['wall_s']
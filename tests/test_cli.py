@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import configparser
+import os
+import runpy
+import shutil
+import subprocess
+import sys
+import pytest
+from setuptools.config.setupcfg import read_configuration
+from pypif import pif
+from pypif.obj import ChemicalSystem, Id, Property, Scalar
+from piftk import cli
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def test_help_does_not_import_the_pipeline():
+    script = """
+import sys
+from piftk import cli
+try:
+    cli.main(['--help'])
+except SystemExit:
+    pass
+heavy = [m for m in ('numpy', 'pandas', 'scipy', 'pypif', 'IN718_porosity_updater') if m in sys.modules]
+print('imported:', ','.join(heavy))
+"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(p for p in sys.path if p)
+    out = subprocess.run([sys.executable, '-c', script], env=env, stdout=subprocess.PIPE,
+                         universal_newlines=True, check=True).stdout
+    assert out.strip().splitlines()[-1] == 'imported:'
+
+
+def test_parse_args():
+    args = cli.parse_args(['merge', 'master', 'porosity', 'develop', '--stats', '--batch-size', '8'])
+    assert args.func is cli.merge
+    assert (args.master_dir, args.porosity_dir, args.develop_dir) == ('master', 'porosity', 'develop')
+    assert args.stats and args.batch_size == 8 and not args.incremental
+    with pytest.raises(SystemExit):
+        cli.parse_args([])
+
+
+def test_filter_design_space(tmpdir):
+    systems = [ChemicalSystem(ids=[Id(name='Sample ID', value='P001_B001_A01')],
+                              properties=[Property(name='total pores', scalars=Scalar(value=3))]),
+               ChemicalSystem(ids=[Id(name='Sample ID', value='P001_B001_A02')])]
+    input_dir = tmpdir.mkdir('refined')
+    with open(str(input_dir.join('P001_B001.json')), 'w') as fh:
+        pif.dump(systems, fh)
+
+    assert cli.main(['filter', 'design-space', str(input_dir), str(tmpdir.join('design'))]) == 0
+    with open(str(tmpdir.join('design', 'P001_B001.json'))) as fh:
+        assert [s.ids[0].value for s in pif.load(fh)] == ['P001_B001_A01']
+    with pytest.raises(SystemExit):
+        cli.main(['filter', 'id', str(input_dir)])
+
+
+def test_installed_console_script(tmpdir):
+    # lay the packages out as an installation from setup.cfg would, and
+    # write the console script of setup.py's entry point as pip does
+    options = read_configuration(os.path.join(ROOT, 'setup.cfg'))['options']
+    site = tmpdir.mkdir('site')
+    for package in options['packages']:
+        source = options['package_dir'].get(package, os.path.join(options['package_dir'][''], package))
+        shutil.copytree(os.path.join(ROOT, source), str(site.join(package)),
+                        ignore=shutil.ignore_patterns('__pycache__', 'example_files'))
+    entry_points = configparser.ConfigParser()
+    entry_points.read_string(runpy.run_path(os.path.join(ROOT, 'setup.py'))['entry_points'])
+    module, func = entry_points['console_scripts']['piftk'].split(':')
+    script = tmpdir.mkdir('bin').join('piftk')
+    script.write("import sys\nfrom {} import {}\nsys.exit({}())\n".format(module, func, func))
+
+    input_dir = tmpdir.mkdir('refined')
+    with open(str(input_dir.join('P001_B001.json')), 'w') as fh:
+        pif.dump([ChemicalSystem(ids=[Id(name='Sample ID', value='P001_B001_A01')],
+                                 properties=[Property(name='total pores', scalars=Scalar(value=3))])], fh)
+    # only the installation and the dependencies are importable, not the checkout
+    checkout = {ROOT, os.path.join(ROOT, 'src'), os.path.join(ROOT, 'tests')}
+    path = [str(site)] + [p for p in sys.path if p and os.path.abspath(p) not in checkout]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path))
+    subprocess.run([sys.executable, str(script), 'filter', 'design-space', str(input_dir), str(tmpdir.join('design'))],
+                   cwd=str(tmpdir), env=env, check=True)
+    assert tmpdir.join('design', 'P001_B001.json').check()
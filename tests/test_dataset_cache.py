@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import numpy as np
+from pypif import pif
+from pypif.obj import ChemicalSystem, Id, Property, Scalar
+from IN718_porosity_updater.array_property import ArrayProperty
+from IN718_porosity_updater.dataset_cache import DatasetCache
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+
+def _system(sample_id, n):
+    return ChemicalSystem(ids=[Id(name='Sample ID', value=sample_id)],
+                          properties=[ArrayProperty(name='pore volume', scalars=np.arange(n) * 0.5),
+                                      ArrayProperty(name='pore cluster labels', scalars=np.arange(n) - 1),
+                                      Property(name='total pores', scalars=Scalar(value=n))])
+
+
+def test_dataset_cache_round_trip(tmpdir):
+    pif_dir = tmpdir.mkdir('develop')
+    systems = [_system('P001_B001_A01', 3), _system('P001_B001_A02', 5)]
+    with open(str(pif_dir.join('P001_B001.json')), 'w') as fh:
+        pif.dump(systems, fh)
+    with open(str(pif_dir.join('P001_B001_A01.json')), 'w') as fh:
+        pif.dump(systems[0], fh)
+
+    cache = DatasetCache.build(str(pif_dir), str(tmpdir.join('cache')))
+    assert cache.files() == ['P001_B001.json', 'P001_B001_A01.json']
+    loaded = cache.load('P001_B001.json')
+    volumes = cache.arrays('P001_B001.json')[0]
+    assert volumes.tolist() == [0.0, 0.5, 1.0, 0.0, 0.5, 1.0, 1.5, 2.0]
+    assert np.shares_memory(loaded[1].properties[0].array, volumes)
+    projected = cache.load('P001_B001.json', properties=['total pores'])
+    assert [prop.name for prop in projected[0].properties] == ['total pores']
+
+    out_dir = tmpdir.mkdir('out')
+    cache.to_pif(str(out_dir))
+    for f in os.listdir(str(pif_dir)):
+        with open(str(pif_dir.join(f))) as fh:
+            expected = pif.dumps(pif.load(fh))
+        assert out_dir.join(f).read() == expected
+
+
+def test_dataset_cache_rebuilds_changed_files(tmpdir):
+    pif_dir = tmpdir.mkdir('develop')
+    path = str(pif_dir.join('P001_B001.json'))
+    with open(path, 'w') as fh:
+        pif.dump([_system('P001_B001_A01', 3)], fh)
+    cache = DatasetCache.build(str(pif_dir), str(tmpdir.join('cache')))
+    assert cache.is_current(path)
+
+    # rewritten with an older modification time than the cache
+    stat = os.stat(path)
+    with open(path, 'w') as fh:
+        pif.dump([_system('P001_B001_A01', 4)], fh)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**10))
+    assert not cache.is_current(path)
+    cache = DatasetCache.build(str(pif_dir), str(tmpdir.join('cache')))
+    assert cache.is_current(path)
+    assert len(cache.arrays('P001_B001.json')[0]) == 4
+
+
+def test_dataset_cache_keeps_non_numeric_lists(tmpdir):
+    pif_dir = tmpdir.mkdir('develop')
+    pif_dir.join('P001_B001.json').write(
+        '[{"category": "system.chemical", "ids": [{"name": "Sample ID", "value": "P001_B001_A01"}], "properties": ['
+        '{"name": "verified", "scalars": [{"value": true}]}, {"name": "notes", "scalars": [{"value": null}]}]}]')
+    cache = DatasetCache.build(str(pif_dir), str(tmpdir.join('cache')))
+    system, = cache.load('P001_B001.json')
+    assert [s.value for s in system.properties[0].scalars] == [True]
+    assert [s.value for s in system.properties[1].scalars] == [None]
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from IN718_porosity_updater.ingest import (
+    CENTER_OF_MASS, MAX_LOCATION, MIN_LOCATION, PORE_COLUMNS, VOLUME, load_sidecar, read_pore_csv,
+    sample_bounds, sidecar_path)
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+EXAMPLE_CSV = os.path.join(os.path.dirname(__file__), os.pardir, 'IN718_porosity_updater',
+                           'example_files', 'P001_B001_F17.csv')
+
+
+def test_read_pore_csv_writes_and_maps_sidecar(tmp_path):
+    csv_path = str(tmp_path / 'P001_B001_F17.csv')
+    shutil.copy(EXAMPLE_CSV, csv_path)
+    assert load_sidecar(csv_path) is None
+
+    parsed = read_pore_csv(csv_path, columns=[VOLUME])
+    assert os.path.exists(sidecar_path(csv_path))
+    assert parsed[VOLUME].dtype == np.float64
+    assert len(parsed[VOLUME]) == 622
+
+    # every pipeline column is cached, whichever subset was requested
+    cached = load_sidecar(csv_path)
+    assert set(cached) == set(PORE_COLUMNS)
+    assert isinstance(cached[VOLUME].base, np.memmap)
+    assert np.array_equal(cached[VOLUME], parsed[VOLUME])
+
+
+def test_stale_sidecar_is_ignored(tmp_path):
+    csv_path = str(tmp_path / 'P001_B001_F17.csv')
+    shutil.copy(EXAMPLE_CSV, csv_path)
+    read_pore_csv(csv_path)
+    later = os.path.getmtime(sidecar_path(csv_path)) + 10
+    os.utime(csv_path, (later, later))
+    assert load_sidecar(csv_path) is None
+
+
+def test_sidecar_of_another_csv_version_is_ignored(tmp_path):
+    csv_path = str(tmp_path / 'P001_B001_F17.csv')
+    shutil.copy(EXAMPLE_CSV, csv_path)
+    read_pore_csv(csv_path)
+    stat = os.stat(csv_path)
+    # a csv restored with an older mtime
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**10))
+    assert load_sidecar(csv_path) is None
+
+    # a csv rewritten within the timestamp resolution
+    read_pore_csv(csv_path)
+    stat = os.stat(csv_path)
+    with open(csv_path, 'ab') as fh:
+        fh.write('\n'.encode('utf-16-le'))
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert load_sidecar(csv_path) is None
+    assert len(read_pore_csv(csv_path)[VOLUME]) == 622
+    assert load_sidecar(csv_path) is not None
+
+
+def test_sample_bounds(tmp_path):
+    csv_path = str(tmp_path / 'P001_B001_F17.csv')
+    shutil.copy(EXAMPLE_CSV, csv_path)
+    lower, upper = sample_bounds(csv_path)
+    df = pd.read_csv(EXAMPLE_CSV, encoding='utf-16')
+    assert lower == tuple(df[MIN_LOCATION].min())
+    assert upper == tuple(df[MAX_LOCATION].max())
+    centers = df[CENTER_OF_MASS].values
+    assert np.all(centers >= lower) and np.all(centers <= upper)
+
+    # the bounds are cached alongside the pipeline columns
+    assert set(load_sidecar(csv_path, MIN_LOCATION + MAX_LOCATION)) == set(MIN_LOCATION + MAX_LOCATION)
+    assert load_sidecar(csv_path) is not None
+    assert sample_bounds(csv_path) == (lower, upper)
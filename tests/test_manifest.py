@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from IN718_porosity_updater.manifest import Manifest
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+
+def test_manifest_tracks_contents_and_params(tmp_path):
+    source = tmp_path / 'input.json'
+    output = tmp_path / 'output.json'
+    source.write_text('[1, 2, 3]')
+    output.write_text('built')
+
+    manifest = Manifest(str(tmp_path))
+    assert not manifest.is_current(str(output), [str(source)], version=1)
+    manifest.record(str(output), [str(source)], version=1)
+    manifest.save()
+
+    reloaded = Manifest(str(tmp_path))
+    assert reloaded.is_current(str(output), [str(source)], version=1)
+    assert not reloaded.is_current(str(output), [str(source)], version=2)
+
+    source.write_text('[1, 2, 4]')
+    assert not Manifest(str(tmp_path)).is_current(str(output), [str(source)], version=1)
+
+    output.unlink()
+    source.write_text('[1, 2, 3]')
+    assert not Manifest(str(tmp_path)).is_current(str(output), [str(source)], version=1)
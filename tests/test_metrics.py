@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import pstats
+import pytest
+from IN718_porosity_updater import metrics
+from IN718_porosity_updater.pipeline import Pipeline, Stage
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+
+@pytest.fixture(autouse=True)
+def disabled_after():
+    yield
+    metrics.disable()
+
+
+def _parse(path, pores):
+    with metrics.stage('parse csv', file='a.csv') as record:
+        record.read(path)
+        metrics.count(pores=pores)
+        record.add(systems=1)
+
+
+def test_disabled_metrics_record_nothing(tmpdir):
+    path = tmpdir.join('a.csv')
+    path.write('x' * 10)
+    assert not metrics.current().enabled
+    assert metrics.stage('parse csv') is metrics.stage('refine')
+    _parse(str(path), 5)
+    assert list(metrics.current().records) == []
+
+
+def test_stages_are_written_as_json_lines(tmpdir):
+    path = tmpdir.join('a.csv')
+    path.write('x' * 10)
+    jsonl = tmpdir.join('metrics.jsonl')
+    recorder = metrics.enable(jsonl=str(jsonl), summary=False, profile=str(tmpdir.join('run.prof')))
+    with metrics.stage('modify master', file='a.json'):
+        _parse(str(path), 5)
+        # counts go to the innermost running stage
+        metrics.count(pores=2)
+    with pytest.raises(ValueError):
+        with metrics.stage('refine'):
+            raise ValueError('bad pif')
+    metrics.disable()
+
+    records = [json.loads(line) for line in jsonl.read().splitlines()]
+    assert [(r['event'], r.get('stage')) for r in records] == [
+        ('stage', 'parse csv'), ('stage', 'modify master'), ('stage', 'refine'), ('end', None)]
+    parse, modify, refine, end = records
+    assert (parse['file'], parse['bytes_read'], parse['pores'], parse['systems']) == ('a.csv', 10, 5, 1)
+    assert (modify['bytes_read'], modify['pores']) == (0, 2)
+    assert modify['wall_s'] >= parse['wall_s'] and parse['peak_rss_mb'] > 0
+    assert refine['error'] == "ValueError('bad pif')"
+    assert pstats.Stats(str(tmpdir.join('run.prof'))).total_calls > 0
+
+    rows = {row['stage']: row for row in recorder.summarize()}
+    assert (rows['parse csv']['calls'], rows['parse csv']['files'], rows['parse csv']['pores']) == (1, 1, 5)
+    out = io.StringIO()
+    recorder.report(file=out)
+    assert [line.split()[1] for line in out.getvalue().splitlines()] == ['stage', 'parse', 'modify', 'refine']
+
+
+def test_pipeline_stages_and_worker_records():
+    recorder = metrics.enable(summary=False)
+    pipeline = Pipeline([Stage('double', lambda systems, context: systems * 2, batch=True)], batch_size=2)
+    assert list(pipeline.run(range(3), file='a.json')) == [0, 1, 0, 1, 2, 2]
+    assert [(r['stage'], r['file'], r['systems']) for r in recorder.records] == [
+        ('double', 'a.json', 2), ('double', 'a.json', 1)]
+
+    result, records = metrics.run_recorded(_parse, __file__, 7)
+    assert result is None and [r['pores'] for r in records] == [7]
+    assert metrics.current() is recorder and len(recorder.records) == 2
+    metrics.emit_all(records)
+    assert recorder.records[-1]['pores'] == 7
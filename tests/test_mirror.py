@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+from IN718_porosity_updater import mirror
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+
+pytestmark = pytest.mark.usefixtures('no_sleep')
+
+
+def test_mirror_fetches_only_changes(tmpdir, local_data_client):
+    server = tmpdir.mkdir('server')
+    server.mkdir('1')
+    server.join('1', 'a.json').write('a')
+    server.join('1', 'b.json').write('b')
+    server.join('1', 'copy_of_a.json').write('a')
+    client = local_data_client(str(server), 1)
+    store = mirror.DatasetMirror(str(tmpdir.join('mirror')))
+
+    assert store.sync(client, 1) == []
+    assert sorted(client.calls) == ['a.json', 'b.json', 'copy_of_a.json']
+    snapshot = store.snapshot(1)
+    assert snapshot['a.json']['sha256'] == snapshot['copy_of_a.json']['sha256']
+    assert len(os.listdir(str(tmpdir.join('mirror', 'objects')))) == 2
+
+    # nothing changed: nothing is fetched
+    client.calls = []
+    assert store.sync(client, 1) == []
+    assert client.calls == []
+
+    # only the changed file is fetched, and its old object can be pruned
+    old_b = store.object_path(snapshot['b.json']['sha256'])
+    server.join('1', 'b.json').write('b, revised')
+    store.sync(client, 1)
+    assert client.calls == ['b.json']
+    assert store.prune() == 1
+    assert not os.path.exists(old_b)
+
+
+def test_mirror_checkout_links_read_only_views(tmpdir, local_data_client):
+    server = tmpdir.mkdir('server')
+    server.mkdir('1')
+    server.join('1', 'a.json').write('a')
+    client = local_data_client(str(server), 1)
+    mirror.DatasetMirror(str(tmpdir.join('mirror'))).sync(client, 1)
+
+    # checking out needs no client
+    store = mirror.DatasetMirror(str(tmpdir.join('mirror')))
+    work = tmpdir.join('work')
+    assert store.checkout(1, str(work)) == [str(work.join('a.json'))]
+    source = store.object_path(store.snapshot(1)['a.json']['sha256'])
+    assert os.path.samefile(str(work.join('a.json')), source)
+    assert not os.stat(source).st_mode & 0o222
+    assert store.checkout(1, str(work)) == []
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+
+import numpy as np
+import pytest
+from pypif import pif
+from pypif.obj import ChemicalSystem, Id, Property, Scalar
+from IN718_porosity_updater import pif_io
+from IN718_porosity_updater.array_property import ArrayProperty, scalar_values
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+
+def _system(values):
+    return ChemicalSystem(
+        names=['P001_B001_F17'],
+        ids=[Id(name='Sample ID', value='P001_B001_F17')],
+        properties=[ArrayProperty(name='pore volume', scalars=values, units='$\\mu m^3$'),
+                    Property(name='total pores', scalars=Scalar(value=len(values))),
+                    Property(name='max pore diameter', scalars=Scalar(value=np.inf))])
+
+
+def test_dumps_matches_pypif():
+    rng = np.random.RandomState(0)
+    values = rng.rand(1000) * 10.0 ** rng.randint(-30, 30, 1000)
+    values[:4] = [0.0, -0.0, 1e-4, 1e16]
+    system = _system(values)
+    assert pif_io.dumps(system) == pif.dumps(system)
+    for ints in (np.arange(-5, 5), np.arange(5, dtype=np.uint64)):
+        assert pif_io.dumps(_system(ints)) == pif.dumps(_system(ints))
+    nonfinite = _system(np.array([1.5, np.nan, -np.inf]))
+    assert pif_io.dumps(nonfinite) == pif.dumps(nonfinite)
+
+
+def test_dump_list_matches_pypif():
+    systems = [_system(np.arange(3.0)), _system(np.arange(2.0))]
+    buffer = io.StringIO()
+    pif_io.dump(systems, buffer)
+    assert buffer.getvalue() == pif.dumps(systems)
+    assert pif.loads(buffer.getvalue())[1].properties[0].scalars[1].value == 1.0
+
+
+def test_iterload_reads_systems_in_chunks():
+    systems = [_system(np.arange(5.0) / 3), _system(np.arange(20))]
+    text = pif.dumps(systems, indent=2)
+    expected = pif.dumps(pif.loads(text))
+    for large_arrays in ('load', 'defer'):
+        loaded = list(pif_io.iterload(io.StringIO(text), large_arrays=large_arrays, threshold=4, chunk_size=7))
+        assert pif_io.dumps(loaded) == expected
+    deferred = next(pif_io.iterload(io.StringIO(text), large_arrays='defer', threshold=4))
+    assert isinstance(deferred.properties[0], ArrayProperty)
+    assert deferred.properties[0].array.tolist() == (np.arange(5.0) / 3).tolist()
+    skipped = next(pif_io.iterload(io.StringIO(text), large_arrays='skip', threshold=4))
+    assert skipped.properties[0].scalars is None
+    assert skipped.properties[1].scalars.value == 5
+
+
+def test_iterload_reads_a_single_pif():
+    system = _system(np.arange(3))
+    loaded = list(pif_io.iterload(io.StringIO(pif.dumps(system)), large_arrays='defer', threshold=1))
+    assert len(loaded) == 1
+    assert isinstance(loaded[0].properties[0], ArrayProperty)
+    assert pif_io.dumps(loaded[0].properties[0]) == pif.dumps(system.properties[0])
+
+
+def test_iterload_projects_properties():
+    system = _system(np.arange(30.0))
+    system.sub_systems = [ChemicalSystem(properties=[Property(name='yield strength', scalars=900),
+                                                     Property(name='ductility', scalars=0.3)])]
+    keep = ['total pores', 'yield strength']
+    for large_arrays in ('load', 'defer'):
+        loaded, = pif_io.iterload(io.StringIO(pif.dumps([system])), large_arrays=large_arrays, properties=keep)
+        assert [prop.name for prop in loaded.properties] == ['total pores']
+        assert [prop.name for prop in loaded.sub_systems[0].properties] == ['yield strength']
+        assert loaded.ids[0].value == 'P001_B001_F17'
+
+
+def test_iterload_projects_systems_without_arrays():
+    # as in the master and develop pifs, whose values are strings or single scalars
+    system = ChemicalSystem(properties=[Property(name='max pore diameter', scalars='75.5', units='$\\mu m$'),
+                                        Property(name='Pore size warning', scalars='GREEN'),
+                                        Property(name='pore cluster count', scalars=Scalar(value=3))])
+    system.sub_systems = [ChemicalSystem(properties=[Property(name='yield strength', scalars='900'),
+                                                     Property(name='ductility', scalars='0.3')])]
+    keep = ['max pore diameter', 'yield strength']
+    for large_arrays in ('load', 'defer', 'skip'):
+        loaded, = pif_io.iterload(io.StringIO(pif.dumps([system])), large_arrays=large_arrays, properties=keep)
+        assert [prop.name for prop in loaded.properties] == ['max pore diameter']
+        assert loaded.properties[0].scalars == '75.5'
+        assert [prop.name for prop in loaded.sub_systems[0].properties] == ['yield strength']
+
+
+def test_failed_write_leaves_previous_output(tmpdir):
+    path = str(tmpdir.join('out.json'))
+    with pif_io.open_output(path) as fh, pif_io.PifWriter(fh) as writer:
+        writer.write(_system([1.0]))
+    previous = open(path).read()
+
+    with pytest.raises(RuntimeError):
+        with pif_io.open_output(path) as fh, pif_io.PifWriter(fh) as writer:
+            writer.write(_system([2.0]))
+            raise RuntimeError('interrupted')
+    assert open(path).read() == previous
+    assert os.listdir(str(tmpdir)) == ['out.json']
+
+    # an interrupted array is not terminated
+    out = io.StringIO()
+    with pytest.raises(RuntimeError):
+        with pif_io.PifWriter(out) as writer:
+            writer.write(_system([2.0]))
+            raise RuntimeError('interrupted')
+    assert not out.getvalue().endswith(']')
+
+
+def test_iterload_keeps_non_numeric_lists():
+    text = ('[{"category": "system.chemical", "properties": ['
+            '{"name": "flags", "scalars": [{"value": true}, {"value": false}]}, '
+            '{"name": "gaps", "scalars": [{"value": null}, {"value": 1.5}]}, '
+            '{"name": "extremes", "scalars": [{"value": -Infinity}, {"value": NaN}, {"value": -2e-3}]}]}]')
+    for large_arrays in ('load', 'defer'):
+        loaded, = pif_io.iterload(io.StringIO(text), large_arrays=large_arrays, threshold=0)
+        flags, gaps, extremes = loaded.properties
+        assert [s.value for s in flags.scalars] == [True, False]
+        assert [s.value for s in gaps.scalars] == [None, 1.5]
+        values = scalar_values(extremes)
+        assert values[0] == -np.inf and np.isnan(values[1]) and values[2] == -2e-3
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+from pypif.obj import ChemicalSystem, Id
+from IN718_porosity_updater.pipeline import STAGES, Pipeline, Stage, register_stage
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+
+@pytest.fixture
+def seen():
+    # registers the 'test tag' stage for the duration of a test
+    seen = []
+
+    def tag(system, context):
+        seen.append(('tag', system.names[0]))
+        system.ids = [Id(name='Sample ID', value=context['prefix'] + system.names[0])]
+        return system if system.names[0] != 'b' else None
+
+    register_stage('test tag', tag)
+    yield seen
+    del STAGES['test tag']
+
+
+def test_pipeline_fuses_stages(seen):
+
+    def count(systems, context):
+        seen.append(('count', len(systems)))
+        return systems
+
+    pipeline = Pipeline(['test tag', Stage('count', count, batch=True)], batch_size=2)
+    systems = (ChemicalSystem(names=[name]) for name in 'abc')
+    out = list(pipeline.run(systems, prefix='P_'))
+    assert [s.ids[0].value for s in out] == ['P_a', 'P_c']
+    # each batch goes through every stage before the next one is read
+    assert seen == [('tag', 'a'), ('tag', 'b'), ('count', 1), ('tag', 'c'), ('count', 1)]
+    assert list(pipeline.counts.items()) == [('test tag', 3), ('count', 2)]
+    assert list(pipeline.timings) == ['test tag', 'count']
+
+
+def test_pipeline_rejects_unknown_stages():
+    with pytest.raises(KeyError):
+        Pipeline(['no such stage'])
+    # the stages of other tests are not left registered
+    with pytest.raises(KeyError):
+        Pipeline(['test tag'])
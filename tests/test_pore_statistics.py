@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+from IN718_porosity_updater.pore_statistics import (
+    PoreStatistics, QuantileSketch, RaggedPoreStatistics, StreamingPoreStatistics,
+    best_fit_distribution, concatenate_samples, diameter_histogram, max_pore_diameter,
+    mean_pore_spacing, median_pore_diameter, median_pore_spacing,
+    nearest_neighbor_distance, pair_correlation, pore_clusters, probability_plot_r,
+    qq_lognormal, qq_normal, ripley_k, sphere_equivalent_diameter)
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+
+@pytest.fixture
+def centers():
+    rng = np.random.RandomState(42)
+    return rng.uniform(0, 1000, size=(3, 500))
+
+
+def test_nearest_neighbor_kdtree_matches_dense(centers):
+    for k in (1, 2, 5):
+        dense = nearest_neighbor_distance(*centers, k=k, method='dense')
+        tree = nearest_neighbor_distance(*centers, k=k, method='kdtree')
+        assert np.allclose(dense, tree)
+
+
+def test_nearest_neighbor_max_distance(centers):
+    dense = nearest_neighbor_distance(*centers, max_distance=50, method='dense')
+    tree = nearest_neighbor_distance(*centers, max_distance=50, method='kdtree')
+    assert np.array_equal(np.isinf(dense), np.isinf(tree))
+    assert np.allclose(dense[np.isfinite(dense)], tree[np.isfinite(tree)])
+
+
+def test_nearest_neighbor_at_max_distance():
+    x, zeros = [0.0, 3.0, 10.0, 20.0], np.zeros(4)
+    for method in ('dense', 'kdtree'):
+        distances = nearest_neighbor_distance(x, zeros, zeros, max_distance=3, method=method)
+        assert distances.tolist() == [3.0, 3.0, np.inf, np.inf]
+
+
+def test_single_pore_has_no_spacing():
+    one = ([10.0], [20.0], [30.0])
+    for method in ('dense', 'kdtree'):
+        assert np.isnan(nearest_neighbor_distance(*one, method=method)).all()
+    assert len(nearest_neighbor_distance([], [], [])) == 0
+    pore_stats = PoreStatistics([3000.0], *one)
+    assert np.isnan(pore_stats.median_pore_spacing) and np.isnan(pore_stats.mean_pore_spacing)
+    ragged = RaggedPoreStatistics([3000.0, 1.0, 2.0], [0, 1, 3], [10.0, 0.0, 3.0], [20.0, 0.0, 4.0],
+                                  [30.0, 0.0, 0.0])
+    assert np.isnan(ragged.median_pore_spacing[0]) and np.isnan(ragged.mean_pore_spacing[0])
+    assert np.allclose(ragged.median_pore_spacing[1], 5.0)
+
+
+def test_nearest_neighbor_unknown_method(centers):
+    with pytest.raises(ValueError):
+        nearest_neighbor_distance(*centers, method='brute')
+
+
+def test_pore_statistics_matches_functions(centers):
+    rng = np.random.RandomState(7)
+    volume = rng.lognormal(8, 1, size=centers.shape[1])
+    pore_stats = PoreStatistics(volume, *centers)
+    assert np.allclose(pore_stats.diameters, sphere_equivalent_diameter(volume))
+    assert np.isclose(pore_stats.median_pore_diameter, median_pore_diameter(volume))
+    assert np.isclose(pore_stats.max_pore_diameter, max_pore_diameter(volume))
+    assert np.isclose(pore_stats.median_pore_spacing, median_pore_spacing(*centers))
+    assert np.isclose(pore_stats.mean_pore_spacing, mean_pore_spacing(*centers))
+    assert pore_stats.total_pores == len(volume)
+    # intermediates are cached, not recomputed
+    assert pore_stats.diameters is pore_stats.diameters
+
+
+def test_pore_statistics_without_centers():
+    pore_stats = PoreStatistics([1.0, 2.0, 3.0, 4.0])
+    assert np.isclose(pore_stats.median_pore_diameter,
+                      median_pore_diameter([1.0, 2.0, 3.0, 4.0]))
+    with pytest.raises(ValueError):
+        pore_stats.median_pore_spacing
+
+
+def test_quantile_sketch_relative_error():
+    values = np.random.RandomState(3).lognormal(3, 1, size=10000)
+    first, second = QuantileSketch(0.01), QuantileSketch(0.01)
+    first.update(values[:4000])
+    second.update(values[4000:])
+    first.merge(second)
+    assert first.count == len(values)
+    for q in (0.1, 0.5, 0.9):
+        exact = np.quantile(values, q)
+        assert abs(first.quantile(q) - exact) <= 0.011*exact
+
+
+def test_streaming_pore_statistics_matches_exact():
+    volume = np.random.RandomState(5).lognormal(9, 1.5, size=5001)
+    streamed = StreamingPoreStatistics(relative_accuracy=0.01)
+    for chunk in np.array_split(volume, 9):
+        streamed.update(chunk)
+    exact = PoreStatistics(volume)
+    assert streamed.total_pores == exact.total_pores
+    assert np.isclose(streamed.max_pore_diameter, exact.max_pore_diameter)
+    assert np.isclose(streamed.mean_pore_diameter, exact.mean_pore_diameter)
+    assert np.isclose(streamed.stdev_pore_diameter, exact.stdev_pore_diameter)
+    assert abs(streamed.median_pore_diameter/exact.median_pore_diameter - 1) <= 0.011
+    assert streamed.bucket_counts.sum() == len(volume)
+
+
+def test_probability_plot_r_matches_probplot():
+    rng = np.random.RandomState(11)
+    samples = [rng.lognormal(3, 0.5, size=n) for n in (12, 12, 40, 2, 1, 0)]
+    values = np.concatenate(samples)
+    offsets = np.cumsum([0] + [len(sample) for sample in samples])
+    r = probability_plot_r(values, offsets)
+    for i, sample in enumerate(samples[:4]):
+        assert np.isclose(r['norm'][i], qq_normal(sample)[2])
+        assert np.isclose(r['lognorm'][i], qq_lognormal(sample)[2])
+    assert np.isnan(r['norm'][4]) and np.isnan(r['norm'][5])
+    best, r_squared = best_fit_distribution(values, offsets)
+    assert best[5] is None
+    assert best[0] in ('norm', 'lognorm', 'weibull', 'gumbel')
+
+
+def test_ragged_pore_statistics_matches_single_samples():
+    rng = np.random.RandomState(13)
+    sizes = (300, 1, 0, 6, 2)
+    volumes = [rng.lognormal(8, 1, size=n) for n in sizes]
+    centers = [rng.uniform(-3000, 3000, size=(3, n)) for n in sizes]
+    volume, offsets = concatenate_samples(volumes)
+    xyz = [concatenate_samples([c[axis] for c in centers])[0] for axis in range(3)]
+    ragged = RaggedPoreStatistics(volume, offsets, *xyz)
+    assert list(ragged.total_pores) == list(sizes)
+    assert np.isnan(ragged.median_pore_diameter[2])
+    for i, n in enumerate(sizes):
+        if n == 0:
+            continue
+        single = PoreStatistics(volumes[i], *centers[i])
+        for name in ('median_pore_diameter', 'mean_pore_diameter', 'max_pore_diameter',
+                     'stdev_pore_diameter', 'median_pore_spacing', 'mean_pore_spacing'):
+            assert np.isclose(getattr(ragged, name)[i], getattr(single, name), equal_nan=True)
+
+
+def test_diameter_histogram_edges_and_ragged():
+    diameters = [10, 50, 99.9, 100, 150, 200, 250]
+    assert list(diameter_histogram(diameters)) == [1, 2, 1, 1, 2]
+    counts = diameter_histogram(diameters, edges=(100,), offsets=[0, 3, 3, 7])
+    assert counts.tolist() == [[3, 0], [0, 0], [0, 4]]
+
+
+def test_spatial_statistics_of_random_pores():
+    # uniformly random pores in a non-cubic box: g(r) ~ 1, K(r) ~ 4/3 pi r^3
+    upper = np.array([400.0, 200.0, 100.0])
+    xyz = np.random.RandomState(17).uniform(0, 1, size=(8000, 3))*upper
+    bounds = ((0, 0, 0), upper)
+    r, g = pair_correlation(*xyz.T, cutoff=20, bins=4, bounds=bounds)
+    assert np.allclose(r, [2.5, 7.5, 12.5, 17.5])
+    assert np.allclose(g[1:], 1, atol=0.1)
+    radii = np.array([10.0, 20.0])
+    K = ripley_k(*xyz.T, radii=radii, bounds=bounds)
+    assert np.allclose(K, 4/3*np.pi*radii**3, rtol=0.1)
+
+
+def test_pore_clusters_labels_chains_by_size():
+    x = [0, 1, 2, 10, 20, 21, 50]
+    labels = pore_clusters(x, np.zeros(7), np.zeros(7), distance=1.5)
+    assert labels.tolist() == [0, 0, 0, -1, 1, 1, -1]
+    labels = pore_clusters(x, np.zeros(7), np.zeros(7), distance=1.5, min_size=3)
+    assert labels.tolist() == [0, 0, 0, -1, -1, -1, -1]
+
+
+def test_cluster_distance_defaults_to_pore_size():
+    # pores of 10 um: centers 12 um apart are chained, 20 um apart are not
+    volume = np.full(4, np.pi/6*10.0**3)
+    pore_stats = PoreStatistics(volume, [0, 12, 40, 60], np.zeros(4), np.zeros(4))
+    assert np.isclose(pore_stats.median_pore_diameter, 10.0)
+    assert pore_stats.clusters().tolist() == [0, 0, -1, -1]
+    assert pore_stats.clusters(20).tolist() == [0, 0, 1, 1]
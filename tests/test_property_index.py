@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gc
+import weakref
+
+import pytest
+from pypif.obj import ChemicalSystem, Property, Scalar
+from IN718_porosity_updater.pipeline import Pipeline, Stage
+from IN718_porosity_updater.property_index import PropertyIndex
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+
+def test_property_index():
+    system = ChemicalSystem()
+    with PropertyIndex.shared():
+        props = PropertyIndex.of(system)
+        assert PropertyIndex.of(system) is props
+    assert PropertyIndex.of(system) is not props
+    assert 'total pores' not in props and len(props) == 0
+    props.append(Property(name='total pores', scalars=Scalar(value=3)))
+    props.append(Property(name='max pore diameter', scalars=Scalar(value=80.0)))
+    assert props.value('total pores') == 3
+    with pytest.raises(KeyError):
+        props['median pore diameter']
+
+    # appending while iterating visits only the properties already present
+    for prop in props:
+        props.append(Property(name=prop.name + ' copy'))
+    assert props.names() == ['total pores', 'max pore diameter', 'total pores copy', 'max pore diameter copy']
+
+    props.set(Property(name='total pores', scalars=Scalar(value=4)))
+    assert props.value('total pores') == 4 and len(props) == 4
+    props.remove('total pores copy')
+    assert props.names() == ['total pores', 'max pore diameter', 'max pore diameter copy']
+
+
+def test_property_index_follows_the_system():
+    system = ChemicalSystem(properties=[Property(name='pore volume')])
+    props = PropertyIndex.of(system)
+    system.properties.append(Property(name='pore volume', scalars=Scalar(value=1)))
+    assert len(props.get_all('pore volume')) == 2
+    system.properties = [Property(name='total pores')]
+    assert 'pore volume' not in props and props.get('total pores') is system.properties[0]
+
+
+def test_indexed_systems_are_collected():
+    with PropertyIndex.shared():
+        system = ChemicalSystem(properties=[Property(name='total pores')])
+        assert 'total pores' in PropertyIndex.of(system)
+    unindexed = ChemicalSystem(properties=[Property(name='total pores')])
+    assert 'total pores' in PropertyIndex.of(unindexed)
+    refs = [weakref.ref(system), weakref.ref(unindexed)]
+    del system, unindexed
+    gc.collect()
+    assert [ref() for ref in refs] == [None, None]
+
+
+def test_pipeline_stages_share_indexes():
+    indexes = []
+    stages = [Stage(name, lambda system, context: indexes.append(PropertyIndex.of(system)) or system)
+              for name in ('first', 'second')]
+    refs = [weakref.ref(system) for system in Pipeline(stages, batch_size=2).run(
+        ChemicalSystem() for _ in range(3))]
+    # both stages of the first batch see the same index of each of its systems
+    assert indexes[0] is indexes[2] and indexes[1] is indexes[3]
+    del indexes[:]
+    gc.collect()
+    assert all(ref() is None for ref in refs)
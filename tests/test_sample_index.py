@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import numpy as np
+from pypif import pif
+from pypif.obj import ChemicalSystem, Id
+from IN718_porosity_updater.array_property import ArrayProperty, scalar_values
+from IN718_porosity_updater.sample_index import INDEX_NAME, SampleIndex
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+
+def _write(directory, name, sample_id):
+    system = ChemicalSystem(ids=[Id(name='Sample ID', value=sample_id)],
+                            properties=[ArrayProperty(name='pore volume', scalars=np.arange(4.0))])
+    with open(os.path.join(str(directory), name), 'w') as fh:
+        pif.dump(system, fh)
+
+
+def test_sample_index(tmpdir):
+    _write(tmpdir, 'a.json', 'P001_B001_A01')
+    _write(tmpdir, 'b.json', 'P001_B001_B02')
+    index = SampleIndex(str(tmpdir))
+    assert os.path.exists(os.path.join(str(tmpdir), INDEX_NAME))
+    assert 'P001_B001_A01' in index and 'P001_B001_C03' not in index
+    assert index.load('P001_B001_C03') is None
+    system = index.load('P001_B001_A01')
+    assert scalar_values(system.properties[0]).tolist() == [0.0, 1.0, 2.0, 3.0]
+    assert index.unmatched() == ['P001_B001_B02']
+
+    _write(tmpdir, 'b.json', 'P001_B001_A01')
+    index = SampleIndex(str(tmpdir))
+    assert len(index) == 1
+    assert index.duplicates == {'P001_B001_A01': ['a.json', 'b.json']}
+    assert index.path_of('P001_B001_A01') == os.path.join(str(tmpdir), 'b.json')
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+from IN718_porosity_updater import transfer
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+
+pytestmark = pytest.mark.usefixtures('no_sleep')
+
+
+def test_download_retries_and_resumes(tmpdir, local_data_client):
+    server = tmpdir.mkdir('server')
+    server.mkdir('1')
+    for name in ('a.json', 'b.json', 'c.json'):
+        server.join('1', name).write(name)
+    local = tmpdir.mkdir('local')
+    client = local_data_client(str(server), fail={'b.json': 2, 'c.json': 3})
+
+    failures = transfer.download_dataset(client, 1, str(local), jobs=2, attempts=3)
+    assert [name for name, error in failures] == ['c.json']
+    assert local.join('b.json').read() == 'b.json'
+    assert client.calls.count('b.json') == 3
+
+    # a second run only transfers what is missing or changed
+    client.calls = []
+    local.join('a.json').write('corrupted')
+    assert transfer.download_dataset(client, 1, str(local), attempts=3) == []
+    assert sorted(client.calls) == ['a.json', 'c.json']
+    assert local.join('a.json').read() == 'a.json'
+
+
+def test_download_fetches_files_changed_on_the_server(tmpdir, local_data_client):
+    server = tmpdir.mkdir('server')
+    server.mkdir('1')
+    server.join('1', 'a.json').write('v1')
+    server.join('1', 'b.json').write('b')
+    local = tmpdir.mkdir('local')
+    client = local_data_client(str(server))
+    assert transfer.download_dataset(client, 1, str(local)) == []
+
+    server.join('1', 'a.json').write('v2')
+    client.calls = []
+    assert transfer.download_dataset(client, 1, str(local)) == []
+    assert client.calls == ['a.json']
+    assert local.join('a.json').read() == 'v2'
+
+    # without an identity in the listing, nothing can be known to be current
+    client = local_data_client(str(server), checksums=False)
+    assert transfer.download_dataset(client, 1, str(local)) == []
+    assert sorted(client.calls) == ['a.json', 'b.json']
+
+
+def test_upload_resumes(tmpdir, local_data_client):
+    server = tmpdir.mkdir('server')
+    local = tmpdir.mkdir('local')
+    for name in ('a.json', 'b.json', 'rejected.json', 'notes.txt'):
+        local.join(name).write(name)
+    client = local_data_client(str(server), fail={'b.json': 1})
+
+    failures = transfer.upload_directory(client, 2, str(local), jobs=4, attempts=2)
+    assert [name for name, error in failures] == ['rejected.json']
+    assert isinstance(failures[0][1], transfer.TransferError)
+    assert sorted(os.listdir(str(server.join('2')))) == ['a.json', 'b.json', 'rejected.json']
+
+    client.calls = []
+    transfer.upload_directory(client, 2, str(local), attempts=2)
+    assert client.calls == ['rejected.json', 'rejected.json']
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+
+import pandas as pd
+import pytest
+from pypif.obj import ChemicalSystem, Id
+from IN718_porosity_updater import pif_io
+from IN718_porosity_updater.array_property import ArrayProperty
+from IN718_porosity_updater.ingest import VOLUME, read_pore_csv
+from IN718_porosity_updater.update_pifs_with_porosity_data import (
+    add_porosity_stats_to_pifs, modify_master_dataset, parse_csv, run_per_file)
+
+__author__ = "Branden Kappes"
+__copyright__ = "Branden Kappes"
+__license__ = "mit"
+
+EXAMPLE_CSV = os.path.join(os.path.dirname(__file__), os.pardir, 'IN718_porosity_updater',
+                           'example_files', 'P001_B001_F17.csv')
+
+
+def _write_csv(path, pores):
+    # the first pores of the example scan, as a tracr export
+    df = pd.read_csv(EXAMPLE_CSV, encoding='utf-16')
+    df.head(pores).to_csv(str(path), encoding='utf-16', index=False)
+
+
+def _parse_dataset(tmpdir, name, **kwargs):
+    # three scans of different sizes and a csv that is not a tracr export
+    csv_dir, pif_dir = tmpdir.ensure_dir(name, 'csvs'), tmpdir.ensure_dir(name, 'pifs')
+    for sample_id, pores in (('P001_B001_A01', 50), ('P001_B001_A02', 5), ('P001_B001_A03', 200)):
+        _write_csv(csv_dir.join(sample_id + '.csv'), pores)
+    csv_dir.join('P001_B001_A00.csv').write_text(u'Label\n1\n', encoding='utf-16')
+    failures = parse_csv(str(csv_dir) + '/', str(pif_dir) + '/', use_cache=False, **kwargs)
+    return failures, pif_dir
+
+
+def _load(path):
+    with open(str(path)) as fh:
+        return {prop['name']: prop for prop in json.load(fh)['properties']}
+
+
+def test_single_pore_sample_has_no_spacing(tmpdir):
+    csv_dir, pif_dir = tmpdir.mkdir('csvs'), tmpdir.mkdir('pifs')
+    _write_csv(csv_dir.join('P001_B001_A01.csv'), 1)
+    assert parse_csv(str(csv_dir) + '/', str(pif_dir) + '/', use_cache=False) == []
+    text = pif_dir.join('P001_B001_A01.json').read()
+    assert 'Infinity' not in text and 'NaN' not in text
+    props = _load(pif_dir.join('P001_B001_A01.json'))
+    assert props['total pores']['scalars']['value'] == 1
+    assert not {'neighbor pore distance', 'median pore spacing', 'mean pore spacing'} & set(props)
+
+
+def test_clusters_scale_with_the_scan(tmpdir):
+    csv_dir, pif_dir = tmpdir.mkdir('csvs'), tmpdir.mkdir('pifs')
+    shutil.copy(EXAMPLE_CSV, str(csv_dir.join('P001_B001_F17.csv')))
+    parse_csv(str(csv_dir) + '/', str(pif_dir) + '/')
+    props = _load(pif_dir.join('P001_B001_F17.json'))
+    # a fixed 100 um is about the typical pore spacing, and chains most pores
+    # of the example scan into ~100 "clusters"; 1.5 median pore diameters
+    # (46 um) only links nearly touching pores
+    assert props['pore cluster count']['scalars']['value'] < 20
+    parse_csv(str(csv_dir) + '/', str(pif_dir) + '/', cluster_distance=100)
+    assert _load(pif_dir.join('P001_B001_F17.json'))['pore cluster count']['scalars']['value'] > 100
+
+
+@pytest.mark.parametrize('jobs', [2, 0, -1, None])
+def test_parse_csv_in_parallel_matches_serial(tmpdir, capsys, jobs):
+    failures, serial_dir = _parse_dataset(tmpdir, 'serial', jobs=1)
+    serial_out = capsys.readouterr().out
+    parallel_failures, parallel_dir = _parse_dataset(tmpdir, 'parallel', jobs=jobs)
+    parallel_out = capsys.readouterr().out
+
+    # the bad csv is reported and the other files are still parsed
+    assert [os.path.basename(task[0]) for task, _ in failures] == ['P001_B001_A00.csv']
+    assert isinstance(failures[0][1], KeyError)
+    assert [os.path.basename(task[0]) for task, _ in parallel_failures] == ['P001_B001_A00.csv']
+    assert sorted(os.listdir(str(parallel_dir))) == ['P001_B001_A01.json', 'P001_B001_A02.json',
+                                                     'P001_B001_A03.json']
+    for f in os.listdir(str(serial_dir)):
+        assert parallel_dir.join(f).read() == serial_dir.join(f).read()
+
+    # results are reported in csv order, whichever worker finishes first
+    def reported(out):
+        return [line.split()[0] + ' ' + os.path.basename(line.split()[1]) for line in out.splitlines()
+                if line.startswith(('PARSED', 'FAILED'))]
+    assert reported(parallel_out) == reported(serial_out) == [
+        'FAILED: P001_B001_A00.csv', 'PARSED: P001_B001_A01.json', 'PARSED: P001_B001_A02.json',
+        'PARSED: P001_B001_A03.json']
+
+
+def test_run_per_file_keeps_task_order():
+    tasks = [(3,), ('x',), (1,), (2,)]
+    for jobs in (1, 3):
+        results, failures = run_per_file(abs, tasks, jobs=jobs)
+        assert results == [3, None, 1, 2]
+        assert [(task, type(err)) for task, err in failures] == [(('x',), TypeError)]
+
+
+def test_pore_csvs_are_paired_with_full_csvs(tmpdir, monkeypatch):
+    csv_dir, pif_dir = tmpdir.mkdir('csvs'), tmpdir.mkdir('pifs')
+    _write_csv(csv_dir.join('P001_B001_A01.csv'), 40)
+    _write_csv(csv_dir.join('P001_B001_A02.csv'), 30)
+    full = pd.read_csv(EXAMPLE_CSV, encoding='utf-16').head(1)
+    full['Volume (µm³)'] = 2.5e9
+    full.to_csv(str(csv_dir.join('P001_B001_A01_full.csv')), encoding='utf-16', index=False)
+    dumped = []
+    dump = pif_io.dump
+
+    def counting_dump(obj, fp, **kwargs):
+        # pifs are written to a temporary file that then replaces the output
+        dumped.append(os.path.splitext(os.path.basename(fp.name))[0] + '.json')
+        return dump(obj, fp, **kwargs)
+    monkeypatch.setattr(pif_io, 'dump', counting_dump)
+
+    assert parse_csv(str(csv_dir) + '/', str(pif_dir) + '/') == []
+    # one pif per pore csv, each written once, the fraction porosity included
+    assert sorted(dumped) == sorted(os.listdir(str(pif_dir))) == ['P001_B001_A01.json', 'P001_B001_A02.json']
+    props = _load(pif_dir.join('P001_B001_A01.json'))
+    # as the baseline computed it: the summed pore volumes over the part volume
+    pore_volume = sum(float(v) for v in pd.read_csv(EXAMPLE_CSV, encoding='utf-16')['Volume (µm³)'][:40])
+    assert props['fraction porosity']['scalars'] == round(float(pore_volume / 2.5e9), 6)
+    # a csv without a _full partner gets no fraction porosity
+    assert 'fraction porosity' not in _load(pif_dir.join('P001_B001_A02.json'))
+
+
+def test_best_fit_is_selected_among_all_distributions():
+    volume = read_pore_csv(EXAMPLE_CSV, use_cache=False)[VOLUME]
+    systems = [ChemicalSystem(ids=[Id(name='Sample ID', value=sample_id)],
+                              properties=[ArrayProperty(name='pore volume', scalars=values)])
+               for sample_id, values in (('A01', volume), ('A02', volume[:1]))]
+    scan, lone_pore = [{prop.name: prop.scalars for prop in system.properties}
+                       for system in add_porosity_stats_to_pifs(systems)]
+    fits = {name: scan['r_squared_' + name] for name in ('norm', 'lognorm', 'weibull', 'gumbel')}
+    # the example scan fits a Gumbel distribution best, not the better of norm and lognorm
+    assert max(fits, key=fits.get) == 'gumbel' and scan['dist_best_fit'] == 'GUMBEL'
+    assert 'dist_best_fit' not in lone_pore
+
+
+def _dumped(capsys):
+    return sorted(os.path.basename(line.split()[1]) for line in capsys.readouterr().out.splitlines()
+                  if line.startswith('DUMPED: '))
+
+
+def test_develop_pifs_depend_on_their_own_porosity_pifs(tmpdir, capsys):
+    master, develop, porosity = (tmpdir.ensure_dir(d) for d in ('master', 'develop', 'porosity'))
+    for f, sample_id in (('a.json', 'P001_B001_A01'), ('b.json', 'P001_B001_B02')):
+        with open(str(master.join(f)), 'w') as fh:
+            pif_io.dump([ChemicalSystem(ids=[Id(name='Sample ID', value=sample_id)])], fh)
+
+    def write_porosity(name, sample_id, volume):
+        system = ChemicalSystem(ids=[Id(name='Sample ID', value=sample_id)],
+                                properties=[ArrayProperty(name='pore volume', scalars=[volume])])
+        with open(str(porosity.join(name)), 'w') as fh:
+            pif_io.dump(system, fh)
+
+    def run():
+        modify_master_dataset(str(master) + '/', str(develop) + '/', str(porosity) + '/',
+                              incremental=True, stages=['porosity data'])
+        return _dumped(capsys)
+
+    write_porosity('A01.json', 'P001_B001_A01', 1.0)
+    assert run() == ['a.json', 'b.json']
+    assert run() == []
+    # a porosity pif arriving for a sample of b.json only rebuilds b.json
+    write_porosity('B02.json', 'P001_B001_B02', 2.0)
+    assert run() == ['b.json']
+    write_porosity('A01.json', 'P001_B001_A01', 3.0)
+    assert run() == ['a.json']
+    write_porosity('C03.json', 'P001_B001_C03', 4.0)
+    assert run() == []